@@ -1,32 +1,52 @@
 # Main FastAPI application that integrates all modules with orchestration and streaming.
 
 import os
-import json
+import hashlib
 import asyncio
 import logging
 import tempfile
 import uuid
 import time
+import orjson
+import aiofiles
+import ahocorasick
+from contextlib import asynccontextmanager
 from typing import List, Dict, Optional
 from fastapi import FastAPI, Request, HTTPException, BackgroundTasks, UploadFile, File, Form
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sse_starlette.sse import EventSourceResponse
 from pydantic import BaseModel, Field
 
-from .rag_module import RAGModule
+from .rag_module import RAGModule, get_rag
 from .sonar_module import SonarModule
-from .hint_module import HintModule
+from .hint_module import HintModule, get_hint
+from . import http_pool, response_cache
+from .document_store import DocumentStore
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build and initialize the modules once per worker at startup instead of at import time.
+    await initialize_modules()
+    yield
+    # Release pooled upstream connections on shutdown
+    if sonar is not None:
+        await sonar.close()
+    if hint is not None:
+        await hint.close()
+    await http_pool.shutdown()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Regulatory Compliance Assistant",
     description="Integrates internal RAG with external compliance citations and provides actionable insights.",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -38,10 +58,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize modules globally
-rag = RAGModule()
-sonar = SonarModule()
-hint = HintModule()
+# Module instances, set up by initialize_modules() and mirrored on app.state
+rag: Optional[RAGModule] = None
+sonar: Optional[SonarModule] = None
+hint: Optional[HintModule] = None
 
 # Pydantic models
 class Query(BaseModel):
@@ -99,195 +119,334 @@ class Document(BaseModel):
     regulations: List[str]
     status: str = "uploaded"
 
-# Global initialization flag
-_initialized = False
+def _sse(obj) -> bytes:
+    # Serialize an object into a raw SSE data frame; bytes pass through sse-starlette untouched.
+    return b"data: " + orjson.dumps(obj) + b"\n\n"
+
+# Pre-encoded status frames emitted on every /chat request
+_SAMPLE_DATA_LOADED_FRAME = _sse({'status': 'Sample data loaded'})
+_HINT_DONE_FRAME = _sse({'status': 'Next step hint generated'})
+_INT_CITES_PREFIX = b'data: {"status":"Internal citations retrieved","count":'
+_EXT_CITES_PREFIX = b'data: {"status":"External citations retrieved","count":'
+_COUNT_SUFFIX = b"}\n\n"
+
+def _count_frame(prefix: bytes, count: int) -> bytes:
+    return prefix + str(count).encode() + _COUNT_SUFFIX
+
+async def _tagged(name: str, aw):
+    # Await a call and pair its outcome with its name; exceptions are returned, not raised.
+    try:
+        return name, await aw
+    except Exception as e:
+        return name, e
+
+def _assemble(user_query: str, internal_citations: List[Dict], external_citations: List[Dict], **fields) -> bytes:
+    # Serialize the final query response once; /chat frames it as SSE and /query returns it as-is.
+    return orjson.dumps({
+        "query": user_query,
+        "internal_citations": internal_citations,
+        "external_citations": external_citations,
+        "summary": {
+            "internal_count": len(internal_citations),
+            "external_count": len(external_citations),
+            "total_citations": len(internal_citations) + len(external_citations)
+        },
+        **fields
+    })
+
+# Global initialization state
+_init_lock = asyncio.Lock()
+_init_done = asyncio.Event()
+
+# Pre-serialized bodies for endpoints whose payload only changes when modules (re)initialize
+_ROOT_BYTES = orjson.dumps({
+    "message": "Unified RAG-Sonar Chat API",
+    "version": "1.0.0",
+    "endpoints": {
+        "/chat": "POST - Streaming chat endpoint with SSE",
+        "/query": "POST - Non-streaming query endpoint",
+        "/health": "GET - Health check endpoint"
+    }
+})
+_health_bytes: Optional[bytes] = None
+_debug_env: Optional[Dict[str, str]] = None
+
+def _refresh_cached_responses():
+    global _health_bytes, _debug_env
+    
+    _health_bytes = orjson.dumps({
+        "status": "healthy",
+        "modules": {
+            "rag": rag.initialized,
+            "sonar": sonar.initialized,
+            "hint": hint.initialized
+        },
+        "version": "1.0.0"
+    })
+    _debug_env = {
+        "PINECONE_API_KEY": "***" if os.environ.get("PINECONE_API_KEY") else "NOT_SET",
+        "PERPLEXITY_API_KEY": "***" if os.environ.get("PERPLEXITY_API_KEY") else "NOT_SET",
+        "PINECONE_ENVIRONMENT": os.environ.get("PINECONE_ENVIRONMENT", "gcp-starter")
+    }
 
 async def initialize_modules():
-    global _initialized
+    global rag, sonar, hint
     
-    if _initialized:
+    if _init_done.is_set():
         return
     
-    try:
-        logger.info("Initializing modules...")
-        
-        # Check for required environment variables
-        required_env_vars = ["PINECONE_API_KEY", "PERPLEXITY_API_KEY"]
-        missing_vars = [var for var in required_env_vars if not os.environ.get(var)]
+    # Concurrent cold requests wait on the lock instead of each running the full initialization
+    async with _init_lock:
+        if _init_done.is_set():
+            return
         
-        if missing_vars:
-            logger.warning(f"Missing environment variables: {missing_vars}")
-            logger.info("Some modules may not function properly without these variables")
-        
-        # Initialize RAG module
         try:
-            rag.initialize()
-            logger.info("RAG module initialized successfully")
-        except Exception as e:
-            logger.error(f"Failed to initialize RAG module: {e}")
-        
-        # Initialize Sonar module
-        try:
-            sonar.initialize()
-            logger.info("Sonar module initialized successfully")
-        except Exception as e:
-            logger.error(f"Failed to initialize Sonar module: {e}")
-        
-        # Initialize Hint module
-        try:
-            hint.initialize()
-            logger.info("Hint module initialized successfully")
+            logger.info("Initializing modules...")
+            
+            # Check for required environment variables
+            required_env_vars = ["PINECONE_API_KEY", "PERPLEXITY_API_KEY"]
+            missing_vars = [var for var in required_env_vars if not os.environ.get(var)]
+            
+            if missing_vars:
+                logger.warning(f"Missing environment variables: {missing_vars}")
+                logger.info("Some modules may not function properly without these variables")
+            
+            # RAG and hint modules are process-wide singletons, loaded once and shared with any other caller
+            if rag is None:
+                rag = get_rag()
+            if rag.initialized:
+                logger.info("RAG module initialized successfully")
+            else:
+                logger.error(f"Failed to initialize RAG module: {rag.initialization_error}")
+            
+            # Initialize Sonar module
+            if sonar is None:
+                sonar = SonarModule()
+            try:
+                sonar.initialize()
+                logger.info("Sonar module initialized successfully")
+            except Exception as e:
+                logger.error(f"Failed to initialize Sonar module: {e}")
+            
+            if hint is None:
+                hint = get_hint()
+            if hint.initialized:
+                logger.info("Hint module initialized successfully")
+            else:
+                logger.error("Failed to initialize Hint module")
+            
+            app.state.rag, app.state.sonar, app.state.hint = rag, sonar, hint
+            
+            _refresh_cached_responses()
+            _init_done.set()
+            logger.info("All modules initialization completed")
+            
         except Exception as e:
-            logger.error(f"Failed to initialize Hint module: {e}")
-        
-        _initialized = True
-        logger.info("All modules initialization completed")
-        
-    except Exception as e:
-        logger.error(f"Error during module initialization: {e}")
-        raise
-
-@app.on_event("startup")
-async def startup_event():
+            logger.error(f"Error during module initialization: {e}")
+            raise
 
-    await initialize_modules()
-
-@app.get("/health", response_model=HealthResponse)
+@app.get("/health", response_model=None, responses={200: {"model": HealthResponse}})
 async def health_check():
 
-    return HealthResponse(
-        status="healthy",
-        modules={
-            "rag": rag.initialized,
-            "sonar": sonar.initialized,
-            "hint": hint.initialized
-        },
-        version="1.0.0"
-    )
+    if _health_bytes is None:
+        await initialize_modules()
+    return Response(_health_bytes, media_type="application/json")
+
+async def _run_pipeline(query: Query, user_query: str):
+    # Shared /chat and /query orchestration. Yields (stage, value) pairs as each stage finishes:
+    # "sample_data", "rag", "sonar" and "hints"; value is the stage result or the exception it raised.
+    debug = logger.isEnabledFor(logging.DEBUG)
+    
+    run_rag = query.use_rag and rag.initialized
+    run_sonar = query.use_sonar and sonar.initialized
+    load_sample = query.load_sample_data and rag.initialized
+    key = response_cache.query_key(user_query, run_rag, run_sonar)
+    
+    # Loading sample data changes the index, so it invalidates every cached response
+    if load_sample:
+        response_cache.clear()
+        rag.clear_cache()
+    
+    cached = response_cache.citation_cache.get(key)
+    
+    tasks = []
+    query_embedding = None
+    internal_citations = []
+    external_citations = []
+    
+    try:
+        # Start the upstream calls before any other setup so their latency overlaps it. Sonar goes
+        # first so the paraphrase lookup below runs while it is in flight rather than ahead of it.
+        if cached is None and run_sonar:
+            tasks.append(asyncio.create_task(_tagged("sonar", sonar.analyze_query(user_query))))
+        
+        # On an exact miss, look for a paraphrase of an earlier query. The embedding is kept
+        # so RAG does not have to compute it again.
+        if cached is None and run_rag and not load_sample:
+            try:
+                query_embedding = await rag.embed_async(user_query)
+                cached = response_cache.semantic_cache.get(query_embedding, (run_rag, run_sonar))
+            except Exception as e:
+                logger.warning(f"Semantic cache lookup failed: {e}")
+            
+            if cached is not None:
+                # The paraphrase already carries external citations, so the Sonar call is not needed
+                for task in tasks:
+                    task.cancel()
+                tasks = []
+            else:
+                # A requested sample-data load changes the index, so in that case RAG starts after it instead
+                tasks.append(asyncio.create_task(_tagged("rag", rag.query_rag_system(
+                    user_query, query_embedding=query_embedding, raise_on_error=True
+                ))))
+        
+        # Load sample data if requested (for testing)
+        if load_sample:
+            try:
+                if debug:
+                    logger.debug("Loading sample data")
+                # Run in a worker thread so blocking I/O does not stall the event loop
+                await asyncio.to_thread(rag.load_sample_data)
+                yield "sample_data", None
+            except Exception as e:
+                logger.error(f"Error loading sample data: {e}")
+                yield "sample_data", e
+            
+            if run_rag:
+                tasks.append(asyncio.create_task(_tagged("rag", rag.query_rag_system(user_query, raise_on_error=True))))
+        
+        if cached is not None:
+            internal_citations, external_citations = cached
+            if run_rag:
+                yield "rag", internal_citations
+            if run_sonar:
+                yield "sonar", external_citations
+        else:
+            if debug:
+                logger.debug("Created %d tasks", len(tasks))
+            
+            # Execute tasks concurrently, reporting each result as soon as its task finishes.
+            # A failed stage still answers with what it has, but the run is not cached.
+            failed = False
+            for completed in asyncio.as_completed(tasks):
+                task_type, result = await completed
+                if debug:
+                    logger.debug("Processing result from %s", task_type)
+                if isinstance(result, Exception):
+                    logger.error(f"Error in {task_type} task: {result}")
+                    failed = True
+                elif task_type == "rag":
+                    internal_citations = result = result or []
+                elif task_type == "sonar":
+                    # Sonar reports API failures as an "error" key next to an empty citation list
+                    if "error" in result:
+                        failed = True
+                    external_citations = result = result["citations"]
+                yield task_type, result
+            
+            if not failed:
+                response_cache.citation_cache[key] = (internal_citations, external_citations)
+                if query_embedding is not None:
+                    response_cache.semantic_cache.put(
+                        query_embedding, (run_rag, run_sonar), (internal_citations, external_citations)
+                    )
+    finally:
+        # If the client goes away mid-stream, don't leave upstream calls running for nobody
+        for task in tasks:
+            task.cancel()
+    
+    # Generate hints if requested. The hint prompt is built from both citation sets,
+    # so it has to wait for RAG and Sonar rather than run beside them.
+    if query.use_hints and hint.initialized:
+        hint_response = response_cache.hint_cache.get(key)
+        if hint_response is None and query_embedding is not None:
+            hint_response = response_cache.semantic_hint_cache.get(query_embedding, (run_rag, run_sonar))
+            if hint_response is not None:
+                # Answer with this request's wording rather than the paraphrase that was cached
+                hint_response = {**hint_response, "query": user_query}
+        if hint_response is not None:
+            yield "hints", hint_response
+            return
+        try:
+            hint_response = await hint.get_contextual_hints(
+                user_query, 
+                internal_citations, 
+                external_citations
+            )
+            # Fallback responses are not worth replaying; the marker is internal and not sent to clients
+            if not hint_response.pop("_fallback", False):
+                response_cache.hint_cache[key] = hint_response
+                if query_embedding is not None:
+                    response_cache.semantic_hint_cache.put(query_embedding, (run_rag, run_sonar), hint_response)
+            yield "hints", hint_response
+        except Exception as e:
+            logger.error(f"Error generating hints: {e}")
+            yield "hints", e
 
 @app.post("/chat")
 async def chat_endpoint(query: Query):
 
     try:
         # Ensure modules are initialized
-        if not _initialized:
+        if not _init_done.is_set():
             await initialize_modules()
         
-        user_query = query.text
-        if not user_query.strip():
+        # Strip once so modules (and any cache keyed on the query) see the canonical text
+        user_query = query.text.strip()
+        if not user_query:
             raise HTTPException(status_code=400, detail="Query text cannot be empty")
         
-        logger.info(f"Processing query: {user_query}")
+        logger.debug("Processing query: %s", user_query)
         
         async def event_generator():
             try:
-                logger.info("Starting event generator")
-                
-                # Load sample data if requested (for testing)
-                if query.load_sample_data and rag.initialized:
-                    try:
-                        logger.info("Loading sample data")
-                        rag.load_sample_data()
-                        yield f"data: {json.dumps({'status': 'Sample data loaded'})}\n\n"
-                    except Exception as e:
-                        logger.error(f"Error loading sample data: {e}")
-                        yield f"data: {json.dumps({'status': 'Error loading sample data', 'error': str(e)})}\n\n"
-                
-                # Initialize result containers
                 internal_citations = []
                 external_citations = []
-                logger.info("Initialized citation containers")
-                
-                # Create concurrent tasks for RAG and Sonar
-                tasks = []
-                
-                if query.use_rag and rag.initialized:
-                    logger.info("Adding RAG task")
-                    tasks.append(("rag", rag.query_rag_system(user_query)))
-                
-                if query.use_sonar and sonar.initialized:
-                    logger.info("Adding Sonar task")
-                    tasks.append(("sonar", sonar.analyze_query(user_query)))
-                
-                logger.info(f"Created {len(tasks)} tasks")
-                
-                # Execute tasks concurrently
-                if tasks:
-                    logger.info("Executing tasks concurrently")
-                    results = await asyncio.gather(
-                        *[task[1] for task in tasks],
-                        return_exceptions=True
-                    )
-                    
-                    logger.info(f"Got {len(results)} results")
-                    
-                    # Process results
-                    for i, (task_type, result) in enumerate(zip([task[0] for task in tasks], results)):
-                        logger.info(f"Processing result {i} from {task_type}")
-                        if isinstance(result, Exception):
-                            logger.error(f"Error in {task_type} task: {result}")
-                            yield f"data: {json.dumps({'error': f'{task_type} module error', 'details': str(result)})}\n\n"
-                        else:
-                            if task_type == "rag":
-                                logger.info(f"Processing RAG result: {type(result)}")
-                                internal_citations = result or []
-                                logger.info(f"Internal citations count: {len(internal_citations)}")
-                                yield f"data: {json.dumps({'status': 'Internal citations retrieved', 'count': len(internal_citations)})}\n\n"
-                            elif task_type == "sonar":
-                                logger.info(f"Processing Sonar result: {type(result)}")
-                                external_citations = result.get('citations', []) if isinstance(result, dict) else []
-                                logger.info(f"External citations count: {len(external_citations)}")
-                                yield f"data: {json.dumps({'status': 'External citations retrieved', 'count': len(external_citations)})}\n\n"
-                
-                logger.info("About to generate hints")
-                # Generate next step hint if hints are requested
                 next_step_hint = None
-                if query.use_hints and hint.initialized:
-                    try:
-                        logger.info("Calling hint.get_contextual_hints")
-                        hint_response = await hint.get_contextual_hints(
-                            user_query, 
-                            internal_citations, 
-                            external_citations
-                        )
-                        logger.info(f"Got hint response: {type(hint_response)}")
-                        next_step_hint = hint_response.get('next_step_hint')
-                        yield f"data: {json.dumps({'status': 'Next step hint generated'})}\n\n"
-                    except Exception as e:
-                        logger.error(f"Error generating hints: {e}")
-                        next_step_hint = "Could not generate hints at this time."
-                        yield f"data: {json.dumps({'status': 'Error generating hints', 'error': str(e)})}\n\n"
+                # Frames that are always followed immediately by another one are held back
+                # and written together with it, saving a send per stream
+                pending = b""
                 
-                logger.info("Preparing final response")
-                # Prepare final response
-                final_response = {
-                    "query": user_query,
-                    "internal_citations": internal_citations,
-                    "external_citations": external_citations,
-                    "next_step_hint": next_step_hint,
-                    "summary": {
-                        "internal_count": len(internal_citations),
-                        "external_count": len(external_citations),
-                        "total_citations": len(internal_citations) + len(external_citations)
-                    },
-                    "status": "completed"
-                }
+                async for stage, value in _run_pipeline(query, user_query):
+                    if stage == "sample_data":
+                        if isinstance(value, Exception):
+                            yield _sse({'status': 'Error loading sample data', 'error': str(value)})
+                        else:
+                            yield _SAMPLE_DATA_LOADED_FRAME
+                    elif stage == "hints":
+                        if isinstance(value, Exception):
+                            next_step_hint = "Could not generate hints at this time."
+                            pending = _sse({'status': 'Error generating hints', 'error': str(value)})
+                        else:
+                            next_step_hint = value.get('next_step_hint')
+                            pending = _HINT_DONE_FRAME
+                    elif isinstance(value, Exception):
+                        yield _sse({'error': f'{stage} module error', 'details': str(value)})
+                    elif stage == "rag":
+                        internal_citations = value
+                        yield _count_frame(_INT_CITES_PREFIX, len(internal_citations))
+                    elif stage == "sonar":
+                        external_citations = value
+                        yield _count_frame(_EXT_CITES_PREFIX, len(external_citations))
                 
-                logger.info("About to yield final response")
-                # Stream the final response
-                yield f"data: {json.dumps(final_response)}\n\n"
-                logger.info("Event generator completed successfully")
+                # Stream the final response, together with the hint status that precedes it
+                final_response = _assemble(
+                    user_query,
+                    internal_citations,
+                    external_citations,
+                    next_step_hint=next_step_hint,
+                    status="completed"
+                )
+                yield pending + b"data: " + final_response + b"\n\n"
                 
             except Exception as e:
-                logger.error(f"Error in event generator: {e}")
-                import traceback
-                logger.error(f"Traceback: {traceback.format_exc()}")
+                logger.exception("Error in event generator")
                 error_response = {
                     "error": "Internal server error",
                     "details": str(e),
                     "status": "error"
                 }
-                yield f"data: {json.dumps(error_response)}\n\n"
+                yield _sse(error_response)
         
         return EventSourceResponse(event_generator())
         
@@ -298,81 +457,39 @@ async def chat_endpoint(query: Query):
         logger.error(f"Unexpected error in /chat endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-@app.post("/query")
+@app.post("/query", response_model=None)
 async def process_query(query: Query):
     try:
         # Ensure modules are initialized
-        if not _initialized:
+        if not _init_done.is_set():
             await initialize_modules()
         
-        user_query = query.text
-        if not user_query.strip():
+        # Strip once so modules (and any cache keyed on the query) see the canonical text
+        user_query = query.text.strip()
+        if not user_query:
             raise HTTPException(status_code=400, detail="Query text cannot be empty")
         
-        logger.info(f"Processing query (non-streaming): {user_query}")
+        logger.debug("Processing query (non-streaming): %s", user_query)
         
-        # Load sample data if requested
-        if query.load_sample_data and rag.initialized:
-            try:
-                rag.load_sample_data()
-            except Exception as e:
-                logger.error(f"Error loading sample data: {e}")
-        
-        # Initialize result containers
         internal_citations = []
         external_citations = []
-        
-        # Create concurrent tasks
-        tasks = []
-        
-        if query.use_rag and rag.initialized:
-            tasks.append(("rag", rag.query_rag_system(user_query)))
-        
-        if query.use_sonar and sonar.initialized:
-            tasks.append(("sonar", sonar.analyze_query(user_query)))
-        
-        # Execute tasks concurrently
-        if tasks:
-            results = await asyncio.gather(
-                *[task[1] for task in tasks],
-                return_exceptions=True
-            )
-            
-            # Process results
-            for i, (task_type, result) in enumerate(zip([task[0] for task in tasks], results)):
-                if isinstance(result, Exception):
-                    logger.error(f"Error in {task_type} task: {result}")
-                else:
-                    if task_type == "rag":
-                        internal_citations = result or []
-                    elif task_type == "sonar":
-                        external_citations = result.get('citations', []) if isinstance(result, dict) else []
-        
-        # Generate hints if requested
         hint_response = {}
-        if query.use_hints and hint.initialized:
-            try:
-                hint_response = await hint.get_contextual_hints(
-                    user_query, 
-                    internal_citations, 
-                    external_citations
-                )
-            except Exception as e:
-                logger.error(f"Error generating hints: {e}")
-                hint_response = {"error": str(e)}
+        
+        async for stage, value in _run_pipeline(query, user_query):
+            if stage == "hints":
+                hint_response = {"error": str(value)} if isinstance(value, Exception) else value
+            elif isinstance(value, Exception):
+                continue
+            elif stage == "rag":
+                internal_citations = value
+            elif stage == "sonar":
+                external_citations = value
         
         # Return complete response
-        return {
-            "query": user_query,
-            "internal_citations": internal_citations,
-            "external_citations": external_citations,
-            "hints": hint_response,
-            "summary": {
-                "internal_count": len(internal_citations),
-                "external_count": len(external_citations),
-                "total_citations": len(internal_citations) + len(external_citations)
-            }
-        }
+        return Response(
+            _assemble(user_query, internal_citations, external_citations, hints=hint_response),
+            media_type="application/json"
+        )
         
     except HTTPException as e:
         raise e
@@ -382,18 +499,10 @@ async def process_query(query: Query):
 
 @app.get("/")
 async def root():
-    return {
-        "message": "Unified RAG-Sonar Chat API",
-        "version": "1.0.0",
-        "endpoints": {
-            "/chat": "POST - Streaming chat endpoint with SSE",
-            "/query": "POST - Non-streaming query endpoint",
-            "/health": "GET - Health check endpoint"
-        }
-    }
+    return Response(_ROOT_BYTES, media_type="application/json")
 
 # Add GET versions of endpoints as specified in the project requirements
-@app.get("/query")
+@app.get("/query", response_model=None)
 async def get_query(
     text: str,
     use_rag: bool = True,
@@ -402,7 +511,8 @@ async def get_query(
     load_sample_data: bool = False
 ):
     # GET version of the query endpoint for simple URL-based queries.
-    query = Query(
+    # Query parameters are already validated by FastAPI, so skip re-validating them in the model
+    query = Query.model_construct(
         text=text,
         use_rag=use_rag,
         use_sonar=use_sonar,
@@ -420,7 +530,8 @@ async def get_chat(
     load_sample_data: bool = False
 ):
     # GET version of the chat endpoint for simple URL-based streaming.
-    query = Query(
+    # Query parameters are already validated by FastAPI, so skip re-validating them in the model
+    query = Query.model_construct(
         text=text,
         use_rag=use_rag,
         use_sonar=use_sonar,
@@ -431,21 +542,65 @@ async def get_chat(
 
 @app.get("/debug")
 async def debug_status():
+    if _debug_env is None:
+        await initialize_modules()
     return {
-        "rag_status": rag.get_status() if hasattr(rag, 'get_status') else {"error": "get_status method not available"},
+        # get_status queries Pinecone index stats through the blocking client
+        "rag_status": await asyncio.to_thread(rag.get_status) if hasattr(rag, 'get_status') else {"error": "get_status method not available"},
         "sonar_initialized": sonar.initialized,
         "hint_initialized": hint.initialized,
-        "environment_vars": {
-            "PINECONE_API_KEY": "***" if os.environ.get("PINECONE_API_KEY") else "NOT_SET",
-            "PERPLEXITY_API_KEY": "***" if os.environ.get("PERPLEXITY_API_KEY") else "NOT_SET",
-            "PINECONE_ENVIRONMENT": os.environ.get("PINECONE_ENVIRONMENT", "gcp-starter")
-        }
+        "environment_vars": _debug_env
     }
 
 # Document storage (in production, you'd use a proper database)
-uploaded_documents = {}
-
-@app.post("/upload-document", response_model=DocumentUploadResponse)
+uploaded_documents = DocumentStore()
+
+# Upload limits
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Characters of document text read for compliance analysis; the prompt uses the first 2000
+ANALYSIS_CONTENT_CHARS = 2500
+
+def _keyword_automaton(keywords: List[str]) -> ahocorasick.Automaton:
+    automaton = ahocorasick.Automaton()
+    for keyword in keywords:
+        automaton.add_word(keyword, keyword)
+    automaton.make_automaton()
+    return automaton
+
+def _contains_any(automaton: ahocorasick.Automaton, text: str) -> bool:
+    # One linear scan over text for all keywords, instead of one substring search per keyword
+    return next(automaton.iter(text), None) is not None
+
+# Keyword classes used to classify compliance analysis results
+_ISSUE_KEYWORDS = _keyword_automaton(['non-compliant', 'violation', 'missing', 'required'])
+_RECOMMENDATION_KEYWORDS = _keyword_automaton(['recommend', 'should', 'must', 'ensure'])
+_REQUIREMENT_KEYWORDS = _keyword_automaton(['requirement', 'must', 'shall', 'mandatory'])
+
+def _excerpt(text: str, limit: int) -> str:
+    # Truncate with an ellipsis only when the text is longer than limit
+    return f"{text[:limit]}..." if len(text) > limit else text
+
+def _matching_excerpts(automaton: ahocorasick.Automaton, contents: List[str]) -> List[str]:
+    # Truncated excerpts of the citation contents that mention any keyword in the automaton
+    return [_excerpt(content, 200) for content in contents if _contains_any(automaton, content.lower())]
+
+def _unique_citations(citations: List[Dict], limit: int) -> List[Dict]:
+    # First `limit` citations, dropping repeats of the same source returned by both RAG and Sonar
+    unique = []
+    seen = set()
+    for c in citations:
+        key = (c.get("title", ""), c.get("url") or c.get("source", ""))
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(c)
+        if len(unique) == limit:
+            break
+    return unique
+
+@app.post("/upload-document", response_model=None, responses={200: {"model": DocumentUploadResponse}})
 async def upload_document(
     file: UploadFile = File(...),
     regulations: str = Form(...)
@@ -453,7 +608,7 @@ async def upload_document(
     """Upload a document for compliance analysis."""
     try:
         # Ensure modules are initialized
-        if not _initialized:
+        if not _init_done.is_set():
             await initialize_modules()
         
         # Validate file type
@@ -469,14 +624,6 @@ async def upload_document(
                 detail="Only PDF and Word documents are supported"
             )
         
-        # Validate file size (10MB limit)
-        content = await file.read()
-        if len(content) > 10 * 1024 * 1024:
-            raise HTTPException(
-                status_code=400,
-                detail="File size cannot exceed 10MB"
-            )
-        
         # Generate unique document ID
         document_id = str(uuid.uuid4())
         
@@ -484,27 +631,43 @@ async def upload_document(
         temp_dir = tempfile.gettempdir()
         file_path = os.path.join(temp_dir, f"{document_id}_{file.filename}")
         
-        with open(file_path, "wb") as f:
-            f.write(content)
+        # Stream to disk in chunks, enforcing the 10MB limit as we go
+        size = 0
+        hasher = hashlib.sha256()
+        async with aiofiles.open(file_path, "wb") as f:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_UPLOAD_SIZE:
+                    break
+                hasher.update(chunk)
+                await f.write(chunk)
+        
+        if size > MAX_UPLOAD_SIZE:
+            os.unlink(file_path)
+            raise HTTPException(
+                status_code=400,
+                detail="File size cannot exceed 10MB"
+            )
         
         # Store document metadata
-        uploaded_documents[document_id] = {
+        uploaded_documents.add({
             "id": document_id,
             "filename": file.filename,
             "content_type": file.content_type,
-            "size": len(content),
+            "size": size,
+            "sha256": hasher.hexdigest(),
             "file_path": file_path,
-            "regulations": json.loads(regulations) if regulations else [],
-            "uploaded_at": asyncio.get_event_loop().time(),
+            "regulations": orjson.loads(regulations) if regulations else [],
+            "uploaded_at": time.time(),
             "content": None  # Will be extracted later
-        }
+        })
         
-        logger.info(f"Document uploaded: {file.filename} ({len(content)} bytes)")
+        logger.info(f"Document uploaded: {file.filename} ({size} bytes)")
         
-        return DocumentUploadResponse(
+        return DocumentUploadResponse.model_construct(
             document_id=document_id,
             filename=file.filename,
-            size=len(content),
+            size=size,
             status="uploaded"
         )
         
@@ -519,7 +682,7 @@ async def analyze_compliance(request: ComplianceAnalysisRequest):
     """Analyze a document for compliance with a specific regulation."""
     try:
         # Ensure modules are initialized
-        if not _initialized:
+        if not _init_done.is_set():
             await initialize_modules()
         
         document_id = request.document_id
@@ -534,7 +697,9 @@ async def analyze_compliance(request: ComplianceAnalysisRequest):
         # Extract text content if not already done
         if document["content"] is None:
             try:
-                document["content"] = await extract_document_text(document["file_path"], document["content_type"])
+                document["content"] = await extract_document_text(
+                    document["file_path"], document["content_type"], max_chars=ANALYSIS_CONTENT_CHARS
+                )
             except Exception as e:
                 logger.error(f"Error extracting text from document: {e}")
                 document["content"] = f"Error extracting text: {str(e)}"
@@ -549,33 +714,43 @@ async def analyze_compliance(request: ComplianceAnalysisRequest):
         citations = []
         
         try:
-            # Use RAG for internal compliance knowledge
+            # Query internal and external sources concurrently
+            calls = []
             if rag.initialized:
-                internal_results = await rag.query_rag_system(query)
+                calls.append(_tagged("rag", rag.query_rag_system(query)))
+            if sonar.initialized:
+                external_query = f"What are the compliance requirements for {regulation}? What are common violations?"
+                calls.append(_tagged("sonar", sonar.analyze_query(external_query)))
+            results = dict(await asyncio.gather(*calls))
+            
+            # A failed source is reported and skipped; the other one's citations are still used
+            for source, result in list(results.items()):
+                if isinstance(result, Exception):
+                    logger.error(f"Error querying {source} during compliance analysis: {result}")
+                    issues.append(f"Analysis error: {str(result)}")
+                    del results[source]
+            
+            # Use RAG for internal compliance knowledge
+            if "rag" in results:
+                internal_results = results["rag"]
                 if internal_results:
                     citations.extend(internal_results)
                     
                     # Extract issues and recommendations from internal results
-                    for result in internal_results:
-                        result_text = result.get('content', '').lower()
-                        if any(word in result_text for word in ['non-compliant', 'violation', 'missing', 'required']):
-                            issues.append(result.get('content', '')[:200] + "...")
-                        if any(word in result_text for word in ['recommend', 'should', 'must', 'ensure']):
-                            recommendations.append(result.get('content', '')[:200] + "...")
+                    internal_contents = [result.get('content', '') for result in internal_results]
+                    issues.extend(_matching_excerpts(_ISSUE_KEYWORDS, internal_contents))
+                    recommendations.extend(_matching_excerpts(_RECOMMENDATION_KEYWORDS, internal_contents))
             
             # Use Sonar for external compliance information
-            if sonar.initialized:
-                external_query = f"What are the compliance requirements for {regulation}? What are common violations?"
-                external_results = await sonar.analyze_query(external_query)
+            if "sonar" in results:
+                external_results = results["sonar"]
                 if external_results and 'citations' in external_results:
                     external_citations = external_results['citations']
                     citations.extend(external_citations)
                     
                     # Extract additional compliance information
-                    for citation in external_citations:
-                        citation_text = citation.get('content', '').lower()
-                        if any(word in citation_text for word in ['requirement', 'must', 'shall', 'mandatory']):
-                            recommendations.append(citation.get('content', '')[:200] + "...")
+                    external_contents = [citation.get('content', '') for citation in external_citations]
+                    recommendations.extend(_matching_excerpts(_REQUIREMENT_KEYWORDS, external_contents))
         
         except Exception as e:
             logger.error(f"Error during compliance analysis: {e}")
@@ -604,15 +779,15 @@ async def analyze_compliance(request: ComplianceAnalysisRequest):
             regulation=regulation,
             compliant=compliant,
             score=score,
-            issues=issues[:5],  # Limit to top 5 issues
-            recommendations=recommendations[:5],  # Limit to top 5 recommendations
+            issues=list(dict.fromkeys(issues))[:5],  # Limit to top 5 distinct issues
+            recommendations=list(dict.fromkeys(recommendations))[:5],  # Limit to top 5 distinct recommendations
             citations=[
                 {
                     "title": c.get("title", ""),
-                    "content": c.get("content", "")[:300] + "...",
+                    "content": _excerpt(c.get("content", ""), 300),
                     "source": c.get("source", ""),
                     "url": c.get("url", "")
-                } for c in citations[:10]  # Limit to top 10 citations
+                } for c in _unique_citations(citations, 10)  # Limit to top 10 distinct citations
             ]
         )
         
@@ -622,8 +797,8 @@ async def analyze_compliance(request: ComplianceAnalysisRequest):
         logger.error(f"Error analyzing compliance: {e}")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
-async def extract_document_text(file_path: str, content_type: str) -> str:
-    """Extract text content from uploaded document."""
+async def extract_document_text(file_path: str, content_type: str, max_chars: int = 4096) -> str:
+    """Extract up to max_chars of text content from uploaded document."""
     try:
         if content_type == "application/pdf":
             # For PDF files - would need PyPDF2 or similar
@@ -636,25 +811,25 @@ async def extract_document_text(file_path: str, content_type: str) -> str:
             return f"Word document content extraction not implemented. File: {file_path}"
         
         else:
-            # Try to read as plain text
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                return f.read()
+            # Try to read as plain text, stopping at the prefix the caller needs
+            async with aiofiles.open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                return await f.read(max_chars)
                 
     except Exception as e:
         logger.error(f"Error extracting text from {file_path}: {e}")
         return f"Error extracting text: {str(e)}"
 
 # Add new endpoints
-@app.post("/search")
+@app.post("/search", response_model=None, responses={200: {"model": List[SearchResult]}})
 async def search_regulatory_content(request: SearchRequest):
     """Search through regulatory compliance content."""
     try:
         # Ensure modules are initialized
-        if not _initialized:
+        if not _init_done.is_set():
             await initialize_modules()
         
-        query_text = request.query
-        if not query_text.strip():
+        query_text = request.query.strip()
+        if not query_text:
             raise HTTPException(status_code=400, detail="Query cannot be empty")
         
         logger.info(f"Processing search query: {query_text}")
@@ -667,7 +842,7 @@ async def search_regulatory_content(request: SearchRequest):
                 internal_results = await rag.query_rag_system(query_text)
                 if internal_results:
                     for i, result in enumerate(internal_results[:request.max_results]):
-                        search_result = SearchResult(
+                        search_result = dict(
                             id=f"internal_{i}",
                             title=result.get("title", f"Regulatory Document {i+1}"),
                             content=result.get("content", "")[:500] + "...",
@@ -691,7 +866,7 @@ async def search_regulatory_content(request: SearchRequest):
                 if external_results and 'citations' in external_results:
                     external_citations = external_results['citations'][:remaining_slots]
                     for i, citation in enumerate(external_citations):
-                        search_result = SearchResult(
+                        search_result = dict(
                             id=f"external_{i}",
                             title=citation.get("title", f"External Citation {i+1}"),
                             content=citation.get("content", "")[:500] + "...",
@@ -707,13 +882,14 @@ async def search_regulatory_content(request: SearchRequest):
         
         # Filter by categories if specified
         if request.categories:
-            results = [r for r in results if r.category in request.categories]
+            results = [r for r in results if r["category"] in request.categories]
         
         # Sort by relevance score
-        results.sort(key=lambda x: x.relevance_score, reverse=True)
+        results.sort(key=lambda x: x["relevance_score"], reverse=True)
         
         logger.info(f"Search completed: {len(results)} results found")
-        return results
+        # Plain dicts go straight to orjson without a jsonable_encoder pass
+        return ORJSONResponse(results)
         
     except HTTPException:
         raise
@@ -721,53 +897,34 @@ async def search_regulatory_content(request: SearchRequest):
         logger.error(f"Error in search endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
-@app.get("/documents")
-async def get_documents():
+@app.get("/documents", response_model=None, responses={200: {"model": List[Document]}})
+async def get_documents(request: Request):
     """Get list of all uploaded documents."""
     try:
-        documents = []
-        for doc_id, doc_data in uploaded_documents.items():
-            document = Document(
-                id=doc_data["id"],
-                filename=doc_data["filename"],
-                size=doc_data["size"],
-                content_type=doc_data["content_type"],
-                uploaded_at=doc_data["uploaded_at"],
-                regulations=doc_data["regulations"],
-                status=doc_data.get("status", "uploaded")
-            )
-            documents.append(document)
+        # Pollers that already have the current listing get a bodiless 304
+        etag = uploaded_documents.etag
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
         
-        # Sort by upload time (most recent first)
-        documents.sort(key=lambda x: x.uploaded_at, reverse=True)
-        
-        logger.info(f"Retrieved {len(documents)} documents")
-        return documents
+        # Serialized once per change, already ordered by upload time (most recent first)
+        logger.info(f"Retrieved {len(uploaded_documents)} documents")
+        return Response(uploaded_documents.listing(), media_type="application/json", headers={"ETag": etag})
         
     except Exception as e:
         logger.error(f"Error retrieving documents: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to retrieve documents: {str(e)}")
 
-@app.get("/documents/{document_id}")
+@app.get("/documents/{document_id}", response_model=None, responses={200: {"model": Document}})
 async def get_document(document_id: str):
     """Get a specific document by ID."""
     try:
         if document_id not in uploaded_documents:
             raise HTTPException(status_code=404, detail="Document not found")
         
-        doc_data = uploaded_documents[document_id]
-        document = Document(
-            id=doc_data["id"],
-            filename=doc_data["filename"],
-            size=doc_data["size"],
-            content_type=doc_data["content_type"],
-            uploaded_at=doc_data["uploaded_at"],
-            regulations=doc_data["regulations"],
-            status=doc_data.get("status", "uploaded")
-        )
+        document = uploaded_documents.summary(document_id)
         
         logger.info(f"Retrieved document: {document_id}")
-        return document
+        return ORJSONResponse(document)
         
     except HTTPException:
         raise
@@ -840,8 +997,7 @@ async def populate_sample_data():
         ]
         
         # Add sample documents to the storage
-        for doc in sample_documents:
-            uploaded_documents[doc["id"]] = doc
+        uploaded_documents.update(sample_documents)
         
         logger.info(f"Added {len(sample_documents)} sample documents")
         
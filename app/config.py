@@ -1,10 +1,16 @@
 import os
 import logging
+import functools
 from typing import Optional
 from dotenv import load_dotenv
 
+@functools.lru_cache(maxsize=1)
+def load_env() -> bool:
+    # Parse .env once per process; modules that need it call this instead of load_dotenv()
+    return load_dotenv()
+
 # Load environment variables from .env file
-load_dotenv()
+load_env()
 
 class Config:
 
@@ -27,6 +33,7 @@ class Config:
     
     # Logging Configuration
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_LEVEL_INT: int = getattr(logging, LOG_LEVEL.upper(), logging.INFO)
     
     @classmethod
     def validate_config(cls) -> tuple[bool, list[str]]:
@@ -43,7 +50,7 @@ class Config:
     @classmethod
     def setup_logging(cls):
         logging.basicConfig(
-            level=getattr(logging, cls.LOG_LEVEL.upper(), logging.INFO),
+            level=cls.LOG_LEVEL_INT,
             format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
         )
 
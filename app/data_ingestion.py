@@ -1,23 +1,44 @@
 # Data Ingestion Module
 
 import os
-import json
+import sys
+import mmap
+import hashlib
+import orjson
 import logging
 from typing import List, Dict, Optional, Set
 from pathlib import Path
 from pinecone import Pinecone, Index, PodSpec, ServerlessSpec
 from sentence_transformers import SentenceTransformer
+import torch
 import time
-from dotenv import load_dotenv
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import re
 
+if __package__:
+    from .config import load_env
+else:
+    # Run directly as a script (python app/data_ingestion.py), so make the app package importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from app.config import load_env
+
 # Load environment variables from .env file
-load_dotenv()
+load_env()
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Characters stripped from generated document IDs
+_NON_ALNUM = re.compile(r'[^a-zA-Z0-9]')
+
+# Connection pool size for the Pinecone client; covers the concurrent upsert workers
+_PINECONE_POOL_THREADS = 16
+
+# Metadata files at least this large are parsed straight from a memory map
+_MMAP_THRESHOLD = 1024 * 1024
+
 class DataIngestionProcessor:
     def __init__(self, required_attributes: Optional[Set[str]] = None, content_field: str = "content", title_field: str = "title"):
 
@@ -50,18 +71,22 @@ class DataIngestionProcessor:
             
             # Initialize Pinecone client
             logger.info("Connecting to Pinecone...")
-            self.pc = Pinecone(api_key=api_key)
+            self.pc = Pinecone(api_key=api_key, pool_threads=_PINECONE_POOL_THREADS)
             
-            # Initialize embeddings model
-            logger.info("Loading SentenceTransformers model...")
-            self.embeddings_model = SentenceTransformer('all-mpnet-base-v2')
+            # Initialize embeddings model, on the GPU in half precision when one is available
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            logger.info(f"Loading SentenceTransformers model on {device}...")
+            self.embeddings_model = SentenceTransformer('all-mpnet-base-v2', device=device)
+            if device == "cuda":
+                self.embeddings_model.half()
             
             # Initialize Pinecone index
             logger.info("Setting up Pinecone index...")
             self.index = self._setup_pinecone_index(
                 index_name="internal-knowledge-base",
                 dimension=768,
-                metric="cosine",
+                # Embeddings are normalized at encode time, so dot product ranks exactly like cosine
+                metric="dotproduct",
                 environment=environment
             )
             
@@ -105,8 +130,8 @@ class DataIngestionProcessor:
             else:
                 logger.info(f"Using existing index: {index_name}")
             
-            # Get index connection
-            index = self.pc.Index(index_name)
+            # Get index connection, sharing one keep-alive pool across upsert threads
+            index = self.pc.Index(index_name, pool_threads=_PINECONE_POOL_THREADS)
             
             # Test connection
             stats = index.describe_index_stats()
@@ -120,13 +145,16 @@ class DataIngestionProcessor:
     
     def _wait_for_index_ready(self, index_name: str, timeout: int = 60):
         start_time = time.time()
+        # Poll quickly at first since new indexes are usually ready within a second or two
+        delay = 0.25
         while time.time() - start_time < timeout:
             try:
                 index = self.pc.Index(index_name)
                 index.describe_index_stats()
                 return
             except Exception:
-                time.sleep(2)
+                time.sleep(delay)
+                delay = min(delay * 1.5, 2.0)
         raise Exception(f"Index {index_name} not ready within {timeout} seconds")
     
     def read_json_files(self) -> List[Dict]:
@@ -146,11 +174,14 @@ class DataIngestionProcessor:
         
         logger.info(f"Found {len(json_files)} JSON files")
         
-        for json_file in json_files:
+        # Read and parse files concurrently; results come back in file order
+        with ThreadPoolExecutor(max_workers=min(16, len(json_files))) as executor:
+            loaded = list(executor.map(self._load_json_file, json_files))
+        
+        for json_file, file_data in zip(json_files, loaded):
             try:
-                logger.info(f"📄 Loading: {json_file.name}")
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    file_data = json.load(f)
+                if isinstance(file_data, Exception):
+                    raise file_data
                 
                 # Handle both single documents and arrays
                 if isinstance(file_data, list):
@@ -169,7 +200,20 @@ class DataIngestionProcessor:
         logger.info(f"✅ Total documents loaded: {len(documents)}")
         return documents
     
-    def create_embeddings(self, documents: List[Dict]) -> List[Dict]:
+    def _load_json_file(self, json_file: Path):
+        # Returns the parsed payload, or the exception so the caller can report it in order
+        try:
+            logger.info(f"📄 Loading: {json_file.name}")
+            if json_file.stat().st_size >= _MMAP_THRESHOLD:
+                # Parse from the page cache instead of copying the whole file into a bytes object first
+                with open(json_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    with memoryview(mm) as view:
+                        return orjson.loads(view)
+            return orjson.loads(json_file.read_bytes())
+        except Exception as e:
+            return e
+    
+    def create_embeddings(self, documents: List[Dict], start: int = 0) -> List[Dict]:
         if not self.initialized:
             logger.error("❌ Processor not initialized")
             return []
@@ -180,92 +224,129 @@ class DataIngestionProcessor:
         
         logger.info(f" Creating embeddings for {len(documents)} documents...")
         
-        embedded_documents = []
-        success_count = 0
+        texts = []
+        prepared = []
         error_count = 0
         
-        for i, doc in enumerate(documents):
+        required = self.required_attributes
+        content_field = self.content_field
+        title_field = self.title_field
+        
+        # Pass 1: validate each document and build everything but its embedding in one walk
+        # start is the position of documents[0] in the full set, keeping logs and fallback IDs unique across chunks
+        for i, doc in enumerate(documents, start=start):
+            # Validate document has required fields; well-formed documents only pay for the subset check
+            if not required.issubset(doc):
+                missing_attrs = sorted(required - doc.keys())
+                logger.warning(f"  ⚠️ Document {i+1} missing: {missing_attrs} - skipping")
+                error_count += 1
+                continue
+            
             try:
-                # Validate document has required fields
-                missing_attrs = [attr for attr in self.required_attributes if attr not in doc]
-                if missing_attrs:
-                    logger.warning(f"  ⚠️ Document {i+1} missing: {missing_attrs} - skipping")
-                    error_count += 1
-                    continue
-                
                 # Extract content and title
-                content = str(doc.get(self.content_field, ""))
-                title = str(doc.get(self.title_field, "No Title"))
+                content = str(doc.get(content_field, ""))
+                title = str(doc.get(title_field, "No Title"))
                 
                 if not content.strip():
                     logger.warning(f"  ⚠️ Document {i+1} has empty content - skipping")
                     error_count += 1
                     continue
                 
-                # Create full text for embedding
-                full_text = f"{title}\n\n{content}"
-                
-                # Generate embedding
-                embedding = self.embeddings_model.encode(full_text, convert_to_tensor=False).tolist()
-                
                 # Create metadata (include all fields except content to avoid duplication)
+                content_length = len(content)
                 metadata = {
                     "title": title,
-                    "excerpt": content[:500] + "..." if len(content) > 500 else content,
-                    "content_length": len(content)
+                    "excerpt": content[:500] + "..." if content_length > 500 else content,
+                    "content_length": content_length
                 }
                 
                 # Add all other fields as metadata
-                for key, value in doc.items():
-                    if key != self.content_field:
-                        if isinstance(value, (dict, list)):
-                            metadata[key] = json.dumps(value)
-                        else:
-                            metadata[key] = str(value)
-                
-                # Generate unique ID
-                doc_id = self._generate_id(doc, i)
-                
-                # Create vector for Pinecone
-                vector = {
-                    "id": doc_id,
-                    "values": embedding,
-                    "metadata": metadata
-                }
-                
-                embedded_documents.append(vector)
-                success_count += 1
+                metadata.update({
+                    key: orjson.dumps(value).decode() if isinstance(value, (dict, list)) else str(value)
+                    for key, value in doc.items() if key != content_field
+                })
                 
-                if (i + 1) % 10 == 0:
-                    logger.info(f"  📊 Processed {i + 1}/{len(documents)} documents")
+                # Create full text for embedding, and the vector ID it will be stored under
+                texts.append(f"{title}\n\n{content}")
+                prepared.append((self._generate_id(doc, i), metadata))
                 
             except Exception as e:
                 logger.error(f"  ❌ Error processing document {i+1}: {e}")
                 error_count += 1
                 continue
         
+        if not texts:
+            logger.info(f"✅ Embedding complete: 0 success, {error_count} errors")
+            return []
+        
+        # Pass 2: embed every document in one batched call instead of one forward pass per document
+        # encode() already length-sorts its inputs and restores the original order, so each
+        # mini-batch is padded only to its own longest text
+        try:
+            with torch.inference_mode():
+                embeddings = self.embeddings_model.encode(
+                    texts,
+                    batch_size=64,
+                    convert_to_numpy=True,
+                    normalize_embeddings=True,
+                    show_progress_bar=True
+                )
+            # Pinecone expects float32 values regardless of the precision the model ran in
+            embeddings = embeddings.astype("float32", copy=False)
+        except Exception as e:
+            logger.error(f"  ❌ Error generating embeddings: {e}")
+            logger.info(f"✅ Embedding complete: 0 success, {error_count + len(texts)} errors")
+            return []
+        
+        # Pass 3: attach embeddings to build the Pinecone vectors
+        embedded_documents = [
+            {
+                "id": doc_id,
+                "values": embedding.tolist(),
+                "metadata": metadata
+            }
+            for (doc_id, metadata), embedding in zip(prepared, embeddings)
+        ]
+        success_count = len(embedded_documents)
+        
         logger.info(f"✅ Embedding complete: {success_count} success, {error_count} errors")
         return embedded_documents
     
     def _generate_id(self, doc: Dict, index: int) -> str:
-        # Get standard and title fields
+        # Get the fields that identify a document
         standard = str(doc.get("standard", "")).strip()
         title = str(doc.get(self.title_field, "")).strip()
+        article_number = str(doc.get("article_number", "")).strip()
         
-        # Combine standard and title
-        combined_text = standard + title
-        
-        # Remove all special characters, keep only alphanumeric characters
-        clean_id = re.sub(r'[^a-zA-Z0-9]', '', combined_text)
-        
-        # If the result is empty or too short, create a fallback ID
-        if not clean_id or len(clean_id) < 3:
-            fallback_text = f"doc{index}standard{standard}title{title}"
-            clean_id = re.sub(r'[^a-zA-Z0-9]', '', fallback_text)
+        # Hash the identifying fields so documents that share a title (e.g. two GDPR articles
+        # both called "Independence") or differ only by punctuation still get distinct IDs.
+        # Documents with none of them fall back to their position in the input.
+        key = f"{standard}\x00{title}\x00{article_number}"
+        if not (standard or title or article_number):
+            key += f"\x00{index}"
+        digest = hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
         
-        return clean_id
+        # Keep a short readable prefix of alphanumeric characters for browsing the index
+        prefix = _NON_ALNUM.sub('', standard + title)[:48]
+        return f"{prefix}-{digest}" if prefix else digest
+    
+    def _upsert_batch(self, batch: List[Dict], batch_num: int, total_batches: int, max_retries: int = 3) -> bool:
+        for attempt in range(max_retries + 1):
+            try:
+                logger.info(f"  📦 Upserting batch {batch_num}/{total_batches} ({len(batch)} documents)")
+                self.index.upsert(vectors=batch)
+                return True
+            except Exception as e:
+                # Back off only when Pinecone says we are being rate limited
+                if getattr(e, "status", None) == 429 and attempt < max_retries:
+                    wait_time = 2 ** attempt
+                    logger.warning(f"  ⏳ Batch {batch_num} rate limited, retrying in {wait_time} seconds...")
+                    time.sleep(wait_time)
+                    continue
+                logger.error(f"  ❌ Error upserting batch {batch_num}: {e}")
+                return False
     
-    def upsert_to_pinecone(self, embedded_documents: List[Dict], batch_size: int = 32) -> bool:
+    def upsert_to_pinecone(self, embedded_documents: List[Dict], batch_size: int = 100, max_concurrency: int = 8) -> bool:
         if not self.initialized:
             logger.error("❌ Processor not initialized")
             return False
@@ -276,29 +357,18 @@ class DataIngestionProcessor:
         
         logger.info(f"📤 Upserting {len(embedded_documents)} documents to Pinecone...")
         
-        total_success = 0
-        total_errors = 0
+        batches = [embedded_documents[i:i + batch_size] for i in range(0, len(embedded_documents), batch_size)]
+        total_batches = len(batches)
         
-        # Process in batches
-        for i in range(0, len(embedded_documents), batch_size):
-            batch = embedded_documents[i:i + batch_size]
-            batch_num = (i // batch_size) + 1
-            total_batches = (len(embedded_documents) + batch_size - 1) // batch_size
-            
-            try:
-                logger.info(f"  📦 Upserting batch {batch_num}/{total_batches} ({len(batch)} documents)")
-                
-                # Upsert to Pinecone
-                self.index.upsert(vectors=batch)
-                total_success += len(batch)
-                
-                # Small delay to avoid rate limiting
-                time.sleep(0.1)
-                
-            except Exception as e:
-                logger.error(f"  ❌ Error upserting batch {batch_num}: {e}")
-                total_errors += len(batch)
-                continue
+        # Upserts are network-bound, so send up to max_concurrency batches at a time
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            results = list(executor.map(
+                lambda args: self._upsert_batch(args[1], args[0], total_batches),
+                enumerate(batches, start=1)
+            ))
+        
+        total_success = sum(len(batch) for batch, ok in zip(batches, results) if ok)
+        total_errors = len(embedded_documents) - total_success
         
         success = total_errors == 0
         status = "✅" if success else "⚠️"
@@ -313,7 +383,7 @@ class DataIngestionProcessor:
         
         return success
     
-    def run_ingestion(self) -> bool:
+    def run_ingestion(self, chunk_size: int = 512) -> bool:
         #Run the complete data ingestion pipeline.
         logger.info("🚀 Starting data ingestion pipeline...")
         
@@ -325,16 +395,31 @@ class DataIngestionProcessor:
                 logger.error("❌ No documents found, aborting pipeline")
                 return False
             
-            # Step 2: Create embeddings
-            logger.info("\n🧠 Step 2: Creating embeddings...")
-            embedded_documents = self.create_embeddings(documents)
-            if not embedded_documents:
+            # Steps 2 and 3: embed documents chunk by chunk while earlier chunks upload,
+            # so the encoder and the network stay busy at the same time
+            logger.info("\n🧠 Step 2: Creating embeddings and ☁️ Step 3: Upserting to Pinecone...")
+            embedded_count = 0
+            results = []
+            in_flight = deque()
+            with ThreadPoolExecutor(max_workers=1) as uploader:
+                for start in range(0, len(documents), chunk_size):
+                    embedded_documents = self.create_embeddings(documents[start:start + chunk_size], start=start)
+                    if not embedded_documents:
+                        continue
+                    embedded_count += len(embedded_documents)
+                    
+                    # Bound how many embedded chunks wait in memory for upload
+                    if len(in_flight) >= 2:
+                        results.append(in_flight.popleft().result())
+                    in_flight.append(uploader.submit(self.upsert_to_pinecone, embedded_documents))
+                
+                results.extend(future.result() for future in in_flight)
+            
+            if not embedded_count:
                 logger.error("❌ No documents embedded successfully, aborting pipeline")
                 return False
             
-            # Step 3: Upsert to Pinecone
-            logger.info("\n☁️ Step 3: Upserting to Pinecone...")
-            success = self.upsert_to_pinecone(embedded_documents)
+            success = all(results)
             
             if success:
                 logger.info("\n🎉 Data ingestion pipeline completed successfully!")
@@ -0,0 +1,94 @@
+# In-memory store for uploaded documents with a recency index and bounded size.
+
+import os
+import uuid
+import bisect
+import logging
+from typing import Dict, List, Optional
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# Fields exposed by the document listing endpoints
+PUBLIC_FIELDS = ("id", "filename", "size", "content_type", "uploaded_at", "regulations", "status")
+
+class DocumentStore:
+    def __init__(self, maxsize: int = 10_000):
+        self.maxsize = maxsize
+        self._documents: Dict[str, Dict] = {}
+        self._summaries: Dict[str, Dict] = {}
+        # (-uploaded_at, id) kept sorted so listings come out most recent first
+        self._order: List[tuple] = []
+        # Serialized listing, rebuilt only after the store changes; the ETag carries a per-process
+        # prefix so a version number from before a restart never matches the new contents
+        self._listing: Optional[bytes] = None
+        self._epoch = uuid.uuid4().hex[:8]
+        self.version = 0
+    
+    def __contains__(self, document_id: str) -> bool:
+        return document_id in self._documents
+    
+    def __getitem__(self, document_id: str) -> Dict:
+        return self._documents[document_id]
+    
+    def __len__(self) -> int:
+        return len(self._documents)
+    
+    @property
+    def etag(self) -> str:
+        return f'"{self._epoch}-{self.version}"'
+    
+    def add(self, document: Dict):
+        document_id = document["id"]
+        if document_id in self._documents:
+            self._remove(document_id)
+        
+        self._documents[document_id] = document
+        self._summaries[document_id] = {
+            field: document.get(field, "uploaded") if field == "status" else document[field]
+            for field in PUBLIC_FIELDS
+        }
+        bisect.insort(self._order, (-document["uploaded_at"], document_id))
+        self._changed()
+        
+        # Evict the oldest uploads once over capacity
+        while len(self._order) > self.maxsize:
+            _, oldest_id = self._order[-1]
+            self._remove(oldest_id, delete_file=True)
+    
+    def update(self, documents: List[Dict]):
+        for document in documents:
+            self.add(document)
+    
+    def summary(self, document_id: str) -> Optional[Dict]:
+        return self._summaries.get(document_id)
+    
+    def summaries(self) -> List[Dict]:
+        # Public view of every document, most recent first
+        return [self._summaries[document_id] for _, document_id in self._order]
+    
+    def listing(self) -> bytes:
+        # JSON body for the document listing, cached until the next change
+        if self._listing is None:
+            self._listing = orjson.dumps(self.summaries())
+        return self._listing
+    
+    def _changed(self):
+        self._listing = None
+        self.version += 1
+    
+    def _remove(self, document_id: str, delete_file: bool = False):
+        document = self._documents.pop(document_id)
+        del self._summaries[document_id]
+        index = bisect.bisect_left(self._order, (-document["uploaded_at"], document_id))
+        del self._order[index]
+        self._changed()
+        
+        if delete_file and document.get("file_path"):
+            try:
+                os.unlink(document["file_path"])
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not remove evicted document file {document['file_path']}: {e}")
@@ -1,19 +1,160 @@
 import os
+import hashlib
 import logging
 import asyncio
+import threading
+import weakref
 import aiohttp
-from typing import List, Dict, Optional
-from tenacity import retry, stop_after_attempt, wait_exponential
+import ahocorasick
+import orjson
+from typing import AsyncIterator, List, Dict, FrozenSet, Optional, Tuple
+from cachetools import TTLCache
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+from . import http_pool
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Keyword categories that select the basic hints; matched as substrings of the lower-cased query
+_HINT_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "gdpr": ('gdpr', 'data protection', 'privacy'),
+    "breach": ('breach',),
+    "transfer": ('transfer', 'cross-border'),
+    "sec": ('sec', 'securities', 'filing'),
+    "sox": ('sox', 'sarbanes', 'internal controls'),
+    "financial_reporting": ('reporting', 'financial'),
+}
+
+# Extra categories used only to pick the focus of the next step prompt
+_FOCUS_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "sox_acronym": ('sox',),
+    "controls": ('reporting', 'control'),
+    "consent": ('consent',),
+}
+
+# Prompt focus for next step hints; the first entry whose categories all matched wins
+_FOCUS_BY_CATEGORIES: Tuple[Tuple[FrozenSet[str], str], ...] = (
+    (frozenset({"breach"}), "breach notification procedures, timelines, and reporting requirements"),
+    (frozenset({"transfer"}), "data transfer mechanisms, adequacy decisions, and safeguards"),
+    (frozenset({"sox_acronym", "controls"}), "internal controls implementation, documentation, and testing procedures"),
+    (frozenset({"consent"}), "consent mechanisms, withdrawal procedures, and documentation"),
+)
+_DEFAULT_FOCUS = "implementation requirements and compliance procedures"
+
+def _category_automaton(*keyword_tables: Dict[str, Tuple[str, ...]]) -> ahocorasick.Automaton:
+    # A keyword can belong to several categories, so each one maps to the tuple of all of them
+    categories_by_keyword: Dict[str, Tuple[str, ...]] = {}
+    for keywords_by_category in keyword_tables:
+        for category, keywords in keywords_by_category.items():
+            for keyword in keywords:
+                categories_by_keyword[keyword] = categories_by_keyword.get(keyword, ()) + (category,)
+    
+    automaton = ahocorasick.Automaton()
+    for keyword, categories in categories_by_keyword.items():
+        automaton.add_word(keyword, categories)
+    automaton.make_automaton()
+    return automaton
+
+# One automaton finds every matched category in a single pass over the query
+_HINT_AUTOMATON = _category_automaton(_HINT_KEYWORDS, _FOCUS_KEYWORDS)
+
+def _matched_categories(query: str) -> FrozenSet[str]:
+    return frozenset(
+        category
+        for _, categories in _HINT_AUTOMATON.iter(query.lower())
+        for category in categories
+    )
+
+class _RateLimited(Exception):
+    # Raised on HTTP 429 so the retry wait can honour the server's Retry-After header
+    def __init__(self, retry_after: Optional[float]):
+        super().__init__(f"Rate limited by Perplexity (retry after {retry_after}s)")
+        self.retry_after = retry_after
+
+def _is_transient(exc: BaseException) -> bool:
+    # Only connection problems, timeouts, rate limiting and 5xx responses are worth retrying;
+    # client errors such as 400/401 surface immediately
+    if isinstance(exc, (aiohttp.ClientConnectionError, asyncio.TimeoutError, _RateLimited)):
+        return True
+    return isinstance(exc, aiohttp.ClientResponseError) and exc.status >= 500
+
+# Jitter keeps concurrent requests from retrying in lockstep
+_jittered_backoff = wait_random_exponential(multiplier=0.5, max=8)
+
+def _retry_wait(retry_state) -> float:
+    exc = retry_state.outcome.exception()
+    if isinstance(exc, _RateLimited) and exc.retry_after is not None:
+        return min(exc.retry_after, 8)
+    return _jittered_backoff(retry_state)
+
+def _retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    try:
+        return max(float(value), 0.0) if value else None
+    except ValueError:
+        # HTTP-date form; fall back to the jittered backoff
+        return None
+
+# Fail fast on slow connects and stalled reads instead of waiting out the whole budget
+_REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=20, connect=3, sock_connect=3, sock_read=15)
+
+# Upper bound on the citation context sent with each next step prompt
+_MAX_CONTEXT_CHARS = 2000
+
+# Shown in place of a next step hint when the API call fails
+_NEXT_STEP_FALLBACK = "Could not generate a next step hint at this time. Please review the provided citations."
+
+# Basic hint tables returned by get_hints
+_GDPR_BREACH_HINTS = (
+    "Implement automated breach detection systems",
+    "Create 72-hour notification templates for supervisory authorities",
+    "Develop breach assessment and documentation procedures"
+)
+_GDPR_TRANSFER_HINTS = (
+    "Review adequacy decisions and Standard Contractual Clauses (SCCs)",
+    "Implement Binding Corporate Rules (BCRs) for intra-group transfers",
+    "Conduct Transfer Impact Assessments (TIAs) for third countries"
+)
+_GDPR_HINTS = (
+    "Map personal data flows and processing activities (Article 30 records)",
+    "Conduct Data Protection Impact Assessments (DPIAs) for high-risk processing",
+    "Implement privacy by design and by default measures"
+)
+_SEC_HINTS = (
+    "Review SEC Form 10-K filing requirements",
+    "Consider materiality thresholds for disclosure",
+    "Consult with legal counsel for securities compliance"
+)
+_SOX_REPORTING_HINTS = (
+    "Implement COSO framework for internal controls design",
+    "Document walkthrough procedures for key business processes",
+    "Establish quarterly management assessment testing protocols"
+)
+_SOX_HINTS = (
+    "Map IT general controls (ITGC) and application controls",
+    "Create SOD (Segregation of Duties) matrices and monitoring",
+    "Implement continuous monitoring using GRC platforms"
+)
+_DEFAULT_HINTS = (
+    "Review relevant compliance documentation",
+    "Consider consulting with legal or compliance teams",
+    "Check for recent regulatory updates"
+)
+
 class HintModule:
     def __init__(self):
         self.initialized = False
         self.api_key: Optional[str] = None
         self.api_url = "https://api.perplexity.ai/chat/completions"
+        # Shared HTTP sessions so keep-alive connections (and their TLS handshakes) are reused.
+        # Sessions are bound to the loop that created them, so there is one per event loop.
+        self._sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = weakref.WeakKeyDictionary()
+        # Background loop used by get_contextual_hints_sync, started on first use
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        # Generated hints keyed on a digest of the full prompt, which determines the response
+        self._hint_cache: TTLCache = TTLCache(maxsize=1024, ttl=86400)
     
     def initialize(self, api_key: str = None):
         try:
@@ -30,7 +171,36 @@ class HintModule:
             logger.error(f"Error initializing Hint module: {e}")
             raise
     
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
+    def _get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                connector=http_pool.get_connector(),
+                connector_owner=False,
+                timeout=_REQUEST_TIMEOUT,
+                # Responses are a few hundred bytes of JSON; compressing them costs more CPU than it saves
+                headers={"Accept-Encoding": "identity"}
+            )
+            self._sessions[loop] = session
+        return session
+    
+    async def close(self):
+        current = asyncio.get_running_loop()
+        for loop, session in list(self._sessions.items()):
+            if session.closed:
+                continue
+            if loop is current:
+                await session.close()
+            elif loop.is_running():
+                # Close it on its own loop rather than touch it from this one
+                asyncio.run_coroutine_threadsafe(session.close(), loop)
+            else:
+                # Nothing can be using it any more, and it does not own the pooled connector
+                session.detach()
+        self._sessions.clear()
+    
+    @retry(stop=stop_after_attempt(3), wait=_retry_wait, retry=retry_if_exception(_is_transient), reraise=True)
     async def _make_api_request(self, payload: dict) -> dict:
         headers = {
             "Authorization": f"Bearer {self.api_key}",
@@ -38,145 +208,184 @@ class HintModule:
             "Accept": "application/json"
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                self.api_url, 
-                headers=headers, 
-                json=payload, 
-                timeout=aiohttp.ClientTimeout(total=20)
-            ) as response:
-                response.raise_for_status()
-                return await response.json()
+        session = self._get_session()
+        async with session.post(
+            self.api_url, 
+            headers=headers, 
+            data=orjson.dumps(payload)
+        ) as response:
+            if response.status == 429:
+                raise _RateLimited(_retry_after_seconds(response.headers.get("Retry-After")))
+            response.raise_for_status()
+            return orjson.loads(await response.read())
+    
+    async def _stream_api_request(self, payload: dict) -> AsyncIterator[str]:
+        # Server-sent events: each "data:" line carries one completion chunk
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream"
+        }
+        
+        session = self._get_session()
+        async with session.post(self.api_url, headers=headers, data=orjson.dumps(payload)) as response:
+            if response.status == 429:
+                raise _RateLimited(_retry_after_seconds(response.headers.get("Retry-After")))
+            response.raise_for_status()
+            async for line in response.content:
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                choices = orjson.loads(data).get("choices")
+                if choices:
+                    content = (choices[0].get("delta") or {}).get("content")
+                    if content:
+                        yield content
+    
+    def _next_step_prompt(self, user_query: str, internal_cites: List[Dict], external_cites: List[Dict]) -> str:
+        # Build context from citations in one pass, capped so the prompt stays small
+        parts = ["User Query: ", user_query, "\n\n"]
+        
+        if internal_cites:
+            parts.append("Internal Citations:\n")
+            parts.extend(  # Limit to top 3 for brevity
+                f"- {cite.get('title', 'N/A')} ({cite.get('source_url', 'N/A')}): {(cite.get('excerpt') or 'N/A')[:200]}...\n"
+                for cite in internal_cites[:3]
+            )
+            parts.append("\n")
+        
+        if external_cites:
+            parts.append("External Citations:\n")
+            parts.extend(  # Limit to top 3 for brevity
+                f"- {cite.get('title', 'N/A')} ({cite.get('type', 'N/A')}): {cite.get('url', 'N/A')}\n"
+                for cite in external_cites[:3]
+            )
+            parts.append("\n")
+        
+        context_text = "".join(parts)[:_MAX_CONTEXT_CHARS]
+        
+        # Create query-specific prompt
+        matched = _matched_categories(user_query)
+        context_focus = next(
+            (focus for categories, focus in _FOCUS_BY_CATEGORIES if categories <= matched),
+            _DEFAULT_FOCUS
+        )
+        
+        prompt_content = (
+            f"Query: {user_query}\n\n"
+            f"{context_text}"
+            f"Focusing specifically on {context_focus}, provide ONE actionable next step (1-2 sentences) "
+            f"that addresses the specific query. Be concrete and implementation-focused. "
+            f"Examples: 'Draft a breach response plan with 72-hour notification timeline.' or "
+            f"'Implement SOC 1 Type II controls for financial reporting systems.'\n\n"
+            f"Specific Next Step:"
+        )
+        return prompt_content
     
-    async def generate_next_step_hint(self, user_query: str, internal_cites: List[Dict], external_cites: List[Dict]) -> str:
+    def _next_step_payload(self, prompt_content: str, stream: bool) -> dict:
+        return {
+            "model": "sonar",  # Using sonar for hint generation
+            "messages": [
+                {
+                    "role": "system", 
+                    "content": "You are a concise assistant providing actionable next steps for compliance and regulatory queries. Keep responses short and practical."
+                },
+                {
+                    "role": "user", 
+                    "content": prompt_content
+                }
+            ],
+            "stream": stream,
+            "max_tokens": 100  # Keep hints concise
+        }
+    
+    async def generate_next_step_hint(self, user_query: str, internal_cites: List[Dict], external_cites: List[Dict],
+                                      raise_on_error: bool = False) -> str:
+        # Failures return a fallback hint unless raise_on_error is set
         if not self.initialized:
             raise RuntimeError("Hint module not initialized")
         
         try:
-            # Build context from citations
-            context_text = f"User Query: {user_query}\n\n"
-            
-            if internal_cites:
-                context_text += "Internal Citations:\n"
-                for cite in internal_cites[:3]:  # Limit to top 3 for brevity
-                    context_text += f"- {cite.get('title', 'N/A')} ({cite.get('source_url', 'N/A')}): {cite.get('excerpt', 'N/A')[:200]}...\n"
-                context_text += "\n"
+            prompt_content = self._next_step_prompt(user_query, internal_cites, external_cites)
             
-            if external_cites:
-                context_text += "External Citations:\n"
-                for cite in external_cites[:3]:  # Limit to top 3 for brevity
-                    context_text += f"- {cite.get('title', 'N/A')} ({cite.get('type', 'N/A')}): {cite.get('url', 'N/A')}\n"
-                context_text += "\n"
-            
-            # Create query-specific prompt
-            query_keywords = user_query.lower()
-            if "breach" in query_keywords:
-                context_focus = "breach notification procedures, timelines, and reporting requirements"
-            elif "transfer" in query_keywords or "cross-border" in query_keywords:
-                context_focus = "data transfer mechanisms, adequacy decisions, and safeguards"
-            elif "sox" in query_keywords and ("reporting" in query_keywords or "control" in query_keywords):
-                context_focus = "internal controls implementation, documentation, and testing procedures"
-            elif "consent" in query_keywords:
-                context_focus = "consent mechanisms, withdrawal procedures, and documentation"
-            else:
-                context_focus = "implementation requirements and compliance procedures"
-            
-            prompt_content = (
-                f"Query: {user_query}\n\n"
-                f"{context_text}"
-                f"Focusing specifically on {context_focus}, provide ONE actionable next step (1-2 sentences) "
-                f"that addresses the specific query. Be concrete and implementation-focused. "
-                f"Examples: 'Draft a breach response plan with 72-hour notification timeline.' or "
-                f"'Implement SOC 1 Type II controls for financial reporting systems.'\n\n"
-                f"Specific Next Step:"
-            )
-            
-            payload = {
-                "model": "sonar",  # Using sonar for hint generation
-                "messages": [
-                    {
-                        "role": "system", 
-                        "content": "You are a concise assistant providing actionable next steps for compliance and regulatory queries. Keep responses short and practical."
-                    },
-                    {
-                        "role": "user", 
-                        "content": prompt_content
-                    }
-                ],
-                "stream": False,
-                "max_tokens": 100  # Keep hints concise
-            }
+            cache_key = hashlib.blake2b(prompt_content.encode(), digest_size=16).hexdigest()
+            cached_hint = self._hint_cache.get(cache_key)
+            if cached_hint is not None:
+                return cached_hint
             
-            data = await self._make_api_request(payload)
+            data = await self._make_api_request(self._next_step_payload(prompt_content, stream=False))
             
             if 'choices' in data and data['choices']:
                 hint = data['choices'][0]['message']['content'].strip()
-                logger.info(f"Generated next step hint for query: {user_query}")
+                logger.info("Generated next step hint for query: %s", user_query)
+                self._hint_cache[cache_key] = hint
                 return hint
+            elif raise_on_error:
+                raise ValueError("Perplexity response contained no choices")
             else:
                 return "Review the provided citations and consider consulting relevant documentation for more details."
                 
         except Exception as e:
             logger.error(f"Error generating next step hint: {e}")
-            return "Could not generate a next step hint at this time. Please review the provided citations."
+            if raise_on_error:
+                raise
+            return _NEXT_STEP_FALLBACK
     
-    def get_hints(self, query: str) -> List[str]:
+    async def stream_next_step_hint(self, user_query: str, internal_cites: List[Dict], external_cites: List[Dict]) -> AsyncIterator[str]:
+        # Streaming variant of generate_next_step_hint: yields text as it arrives so callers can show
+        # partial output or stop early. Only hints received in full are cached.
         if not self.initialized:
             raise RuntimeError("Hint module not initialized")
         
-        # Basic hints based on query content
-        hints = []
-        query_lower = query.lower()
-        
-        if any(keyword in query_lower for keyword in ['gdpr', 'data protection', 'privacy']):
-            if 'breach' in query_lower:
-                hints.extend([
-                    "Implement automated breach detection systems",
-                    "Create 72-hour notification templates for supervisory authorities",
-                    "Develop breach assessment and documentation procedures"
-                ])
-            elif 'transfer' in query_lower or 'cross-border' in query_lower:
-                hints.extend([
-                    "Review adequacy decisions and Standard Contractual Clauses (SCCs)",
-                    "Implement Binding Corporate Rules (BCRs) for intra-group transfers",
-                    "Conduct Transfer Impact Assessments (TIAs) for third countries"
-                ])
-            else:
-                hints.extend([
-                    "Map personal data flows and processing activities (Article 30 records)",
-                    "Conduct Data Protection Impact Assessments (DPIAs) for high-risk processing",
-                    "Implement privacy by design and by default measures"
-                ])
-        
-        if any(keyword in query_lower for keyword in ['sec', 'securities', 'filing']):
-            hints.extend([
-                "Review SEC Form 10-K filing requirements",
-                "Consider materiality thresholds for disclosure",
-                "Consult with legal counsel for securities compliance"
-            ])
-        
-        if any(keyword in query_lower for keyword in ['sox', 'sarbanes', 'internal controls']):
-            if 'reporting' in query_lower or 'financial' in query_lower:
-                hints.extend([
-                    "Implement COSO framework for internal controls design",
-                    "Document walkthrough procedures for key business processes",
-                    "Establish quarterly management assessment testing protocols"
-                ])
-            else:
-                hints.extend([
-                    "Map IT general controls (ITGC) and application controls",
-                    "Create SOD (Segregation of Duties) matrices and monitoring",
-                    "Implement continuous monitoring using GRC platforms"
-                ])
-        
-        if not hints:
-            hints = [
-                "Review relevant compliance documentation",
-                "Consider consulting with legal or compliance teams",
-                "Check for recent regulatory updates"
-            ]
-        
-        return hints[:3]  # Return top 3 hints
+        prompt_content = self._next_step_prompt(user_query, internal_cites, external_cites)
+        cache_key = hashlib.blake2b(prompt_content.encode(), digest_size=16).hexdigest()
+        cached_hint = self._hint_cache.get(cache_key)
+        if cached_hint is not None:
+            yield cached_hint
+            return
+        
+        pieces = []
+        try:
+            async for piece in self._stream_api_request(self._next_step_payload(prompt_content, stream=True)):
+                pieces.append(piece)
+                yield piece
+        except Exception as e:
+            logger.error(f"Error streaming next step hint: {e}")
+            if not pieces:
+                yield _NEXT_STEP_FALLBACK
+            return
+        
+        hint = "".join(pieces).strip()
+        if hint:
+            logger.info("Generated next step hint for query: %s", user_query)
+            self._hint_cache[cache_key] = hint
+    
+    def get_hints(self, query: str) -> Tuple[str, ...]:
+        if not self.initialized:
+            raise RuntimeError("Hint module not initialized")
+        
+        # Basic hints based on query content. Each table holds three hints, so the
+        # first matching category (GDPR, then SEC, then SOX) supplies the result.
+        matched = _matched_categories(query)
+        
+        if "gdpr" in matched:
+            if "breach" in matched:
+                return _GDPR_BREACH_HINTS
+            elif "transfer" in matched:
+                return _GDPR_TRANSFER_HINTS
+            return _GDPR_HINTS
+        
+        if "sec" in matched:
+            return _SEC_HINTS
+        
+        if "sox" in matched:
+            if "financial_reporting" in matched:
+                return _SOX_REPORTING_HINTS
+            return _SOX_HINTS
+        
+        return _DEFAULT_HINTS
     
     async def get_contextual_hints(self, query: str, internal_cites: List[Dict] = None, external_cites: List[Dict] = None) -> Dict:
         if not self.initialized:
@@ -186,30 +395,68 @@ class HintModule:
             # Get basic hints
             basic_hints = self.get_hints(query)
             
-            # Generate next step hint if citations are provided
-            next_step_hint = None
-            if internal_cites or external_cites:
-                next_step_hint = await self.generate_next_step_hint(
-                    query, 
-                    internal_cites or [], 
-                    external_cites or []
-                )
-            
-            return {
+            response = {
                 "basic_hints": basic_hints,
-                "next_step_hint": next_step_hint,
+                "next_step_hint": None,
                 "query": query
             }
             
+            # Generate next step hint if citations are provided
+            if internal_cites or external_cites:
+                try:
+                    response["next_step_hint"] = await self.generate_next_step_hint(
+                        query, 
+                        internal_cites or [], 
+                        external_cites or [],
+                        raise_on_error=True
+                    )
+                except Exception:
+                    # Still answer with the basic hints; the private "_fallback" key keeps this out of the caches
+                    response["next_step_hint"] = _NEXT_STEP_FALLBACK
+                    response["_fallback"] = True
+            
+            return response
+            
         except Exception as e:
             logger.error(f"Error getting contextual hints: {e}")
             return {
                 "basic_hints": self.get_hints(query),
                 "next_step_hint": "Could not generate contextual hint at this time.",
                 "query": query,
-                "error": str(e)
+                "error": str(e),
+                "_fallback": True
             }
     
+    def _background_loop(self) -> asyncio.AbstractEventLoop:
+        # Long-lived loop on a daemon thread for the sync wrapper, so its HTTP session survives between calls
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="hint-module-loop", daemon=True).start()
+        return self._loop
+    
     # Synchronous wrapper for backward compatibility
     def get_contextual_hints_sync(self, query: str, internal_cites: List[Dict] = None, external_cites: List[Dict] = None) -> Dict:
-        return asyncio.run(self.get_contextual_hints(query, internal_cites, external_cites)) 
\ No newline at end of file
+        future = asyncio.run_coroutine_threadsafe(
+            self.get_contextual_hints(query, internal_cites, external_cites),
+            self._background_loop()
+        )
+        return future.result()
+
+# Process-wide instance shared by the API and scripts
+_instance: Optional[HintModule] = None
+_instance_lock = threading.Lock()
+
+def get_hint() -> HintModule:
+    global _instance
+    if _instance is None:
+        with _instance_lock:
+            if _instance is None:
+                instance = HintModule()
+                try:
+                    instance.initialize()
+                except Exception:
+                    # Already logged by initialize; callers check instance.initialized
+                    pass
+                _instance = instance
+    return _instance
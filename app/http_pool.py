@@ -0,0 +1,30 @@
+# Process-wide connection pool for Perplexity API calls, shared by the Sonar and hint modules.
+
+import asyncio
+import weakref
+
+import aiohttp
+
+# One connector per event loop, since connectors cannot be used across loops. Sessions borrow it,
+# so both modules reuse the same keep-alive connections, DNS cache and TLS sessions.
+_connectors: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.TCPConnector]" = weakref.WeakKeyDictionary()
+
+def get_connector() -> aiohttp.TCPConnector:
+    loop = asyncio.get_running_loop()
+    connector = _connectors.get(loop)
+    if connector is None or connector.closed:
+        connector = aiohttp.TCPConnector(
+            limit=100,
+            limit_per_host=20,
+            ttl_dns_cache=600,
+            keepalive_timeout=60,
+            enable_cleanup_closed=True
+        )
+        _connectors[loop] = connector
+    return connector
+
+async def shutdown():
+    # Close the running loop's pool; sessions built on it must be closed first
+    connector = _connectors.pop(asyncio.get_running_loop(), None)
+    if connector is not None and not connector.closed:
+        await connector.close()
@@ -0,0 +1,74 @@
+# Micro-batches query embeddings across concurrent requests.
+
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Callable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+class _LoopQueue:
+    # Queries waiting on one event loop, and the task draining them
+    __slots__ = ("pending", "flush_task")
+    
+    def __init__(self):
+        self.pending: List[Tuple[str, asyncio.Future]] = []
+        self.flush_task: Optional[asyncio.Task] = None
+
+class QueryCoalescer:
+    # Queries submitted within one short window are embedded together in a single batch call.
+    # The batch runs in a worker thread so encoding does not stall the event loop, and queries
+    # arriving while a batch is in flight are picked up by the next one without waiting again.
+    
+    def __init__(self, embed_batch: Callable[[List[str]], Sequence[Sequence[float]]],
+                 window: float = 0.01, max_batch: int = 64):
+        self._embed_batch = embed_batch
+        self._window = window
+        self._max_batch = max_batch
+        # One queue per event loop: a future may only be resolved from the loop that owns it, so
+        # submissions from different loops (the sync wrappers run their own) are never batched together
+        self._queues: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopQueue]" = weakref.WeakKeyDictionary()
+        self._queues_lock = threading.Lock()
+    
+    async def submit(self, text: str) -> Sequence[float]:
+        loop = asyncio.get_running_loop()
+        with self._queues_lock:
+            queue = self._queues.get(loop)
+            if queue is None:
+                queue = self._queues[loop] = _LoopQueue()
+        
+        future = loop.create_future()
+        queue.pending.append((text, future))
+        
+        # A single flush task per loop drains its queue; start one if none is running
+        if queue.flush_task is None:
+            queue.flush_task = loop.create_task(self._flush(queue))
+        
+        return await future
+    
+    async def _flush(self, queue: _LoopQueue):
+        try:
+            await asyncio.sleep(self._window)
+            
+            while queue.pending:
+                batch = queue.pending[:self._max_batch]
+                del queue.pending[:self._max_batch]
+                
+                try:
+                    embeddings = await asyncio.to_thread(self._embed_batch, [text for text, _ in batch])
+                except Exception as e:
+                    logger.error(f"Error generating batched embeddings: {e}")
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                
+                for (_, future), embedding in zip(batch, embeddings):
+                    # Submitters may have been cancelled while the batch was running
+                    if not future.done():
+                        future.set_result(embedding)
+        finally:
+            # Cleared with no await after the last pending check, so a new submission always finds
+            # either this task still draining or no task at all
+            queue.flush_task = None
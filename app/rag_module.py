@@ -1,22 +1,40 @@
 import os
+import asyncio
 import logging
-from typing import List, Dict, Optional
-from pinecone import Pinecone, Index
+import threading
+from typing import List, Dict, Optional, Sequence
+import numpy as np
+from cachetools import TTLCache
+from pinecone.grpc import PineconeGRPC, GRPCIndex
 from sentence_transformers import SentenceTransformer
+import torch
 import dotenv
 import time
 
+from .query_coalescer import QueryCoalescer
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _as_list(embedding: Sequence[float]) -> List[float]:
+    # Pinecone takes plain float lists; embeddings stay numpy arrays until they reach it
+    return embedding.tolist() if isinstance(embedding, np.ndarray) else embedding
+
 class RAGModule:
     def __init__(self):
         self.initialized = False
-        self.index: Optional[Index] = None
+        self.index: Optional[GRPCIndex] = None
         self.embeddings_model = None
         self.pc = None
         self.initialization_error = None
+        # Citations keyed on (query, top_k, metadata); cleared whenever the index contents change
+        self._query_cache: TTLCache = TTLCache(maxsize=1024, ttl=3600)
+        # Query embeddings from concurrent requests are encoded together; one batch fills one encode() pass
+        self._coalescer = QueryCoalescer(self.embed_batch, window=0.005, max_batch=32)
+    
+    def clear_cache(self):
+        self._query_cache.clear()
     
     def initialize(self, api_key: str = None, environment: str = None):
         # Initialize the RAG module with Pinecone and SentenceTransformers embeddings.
@@ -30,15 +48,18 @@ class RAGModule:
             if not api_key:
                 raise ValueError("PINECONE_API_KEY not provided or found in environment")
             
-            logger.info("Initializing Pinecone client...")
-            # Initialize Pinecone with better error handling
-            self.pc = Pinecone(api_key=api_key)
+            logger.info("Initializing Pinecone gRPC client...")
+            # The gRPC client multiplexes queries over one HTTP/2 channel with protobuf payloads
+            self.pc = PineconeGRPC(api_key=api_key)
             
-            logger.info("Loading SentenceTransformers model...")
-            # Initialize embeddings model using sentence-transformers
+            # Initialize embeddings model using sentence-transformers, on the GPU in half precision when available
             # Using all-mpnet-base-v2 model that produces 768-dimensional embeddings (high quality)
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            logger.info(f"Loading SentenceTransformers model on {device}...")
             try:
-                self.embeddings_model = SentenceTransformer('all-mpnet-base-v2')
+                self.embeddings_model = SentenceTransformer('all-mpnet-base-v2', device=device)
+                if device == "cuda":
+                    self.embeddings_model.half()
                 logger.info("SentenceTransformers model loaded successfully")
             except Exception as e:
                 logger.error(f"Failed to load SentenceTransformers model: {e}")
@@ -58,7 +79,7 @@ class RAGModule:
             self.initialized = False
             # Don't raise the exception, just log it and mark as not initialized
     
-    def _connect_to_index(self, index_name: str, max_retries: int = 3) -> Index:
+    def _connect_to_index(self, index_name: str, max_retries: int = 3) -> GRPCIndex:
         for attempt in range(max_retries):
             try:
                 logger.info(f"Attempting to connect to index '{index_name}' (attempt {attempt + 1}/{max_retries})")
@@ -101,19 +122,70 @@ class RAGModule:
         
         raise Exception("Failed to connect to index after all retries")
     
-    def _generate_embedding(self, text: str) -> List[float]:
+    def _generate_embedding(self, text: str) -> np.ndarray:
         if not self.embeddings_model:
             raise RuntimeError("Embeddings model not initialized")
         
         try:
-            embedding = self.embeddings_model.encode(text, convert_to_tensor=False)
-            return embedding.tolist()
+            # Unit-length float32 vectors, so the index can rank by plain dot product. Kept as an
+            # array: the semantic caches use it as-is and only the Pinecone query needs a list.
+            embedding = self.embeddings_model.encode(text, convert_to_numpy=True, normalize_embeddings=True)
+            return embedding.astype(np.float32, copy=False)
         except Exception as e:
             logger.error(f"Error generating embedding: {e}")
             raise
     
-    async def query_rag_system(self, query: str, top_k: int = 3) -> List[Dict]:
+    def embed(self, text: str) -> np.ndarray:
+        # Public embedding helper so callers can reuse one query embedding across caches and searches.
+        return self._generate_embedding(text)
+    
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        # Encode several queries in one model call; used to coalesce concurrent requests.
+        if not self.embeddings_model:
+            raise RuntimeError("Embeddings model not initialized")
+        
+        embeddings = self.embeddings_model.encode(
+            texts, batch_size=32, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False
+        )
+        return embeddings.astype(np.float32, copy=False)
+    
+    def _citation(self, metadata: Optional[Dict], score: Optional[float]) -> Dict:
+        metadata = metadata or {}
+        get = metadata.get
+        # Fallbacks are only built when the primary field is missing, instead of on every match
+        excerpt = metadata["excerpt"] if "excerpt" in metadata else get("content", "No excerpt available.")[:200] + "..."
+        # Get the source URL from the Pinecone record
+        source_url = metadata["url"] if "url" in metadata else get("source_url", "N/A")
+        
+        return {
+            "title": get("title", "N/A"),
+            "excerpt": excerpt,
+            "source": source_url,  # Source field using the URL from Pinecone record
+            "source_type": "Internal Database",
+            "standard": get("standard", "unknown").upper(),
+            "article_number": get("article_number", "N/A"),
+            "document_type": get("document_type", "general"),
+            "score": score  # Include score for debugging/analysis
+        }
+    
+    def _to_citations(self, matches) -> List[Dict]:
+        citation = self._citation
+        return [citation(match.metadata, match.score) for match in matches]
+    
+    async def embed_async(self, text: str) -> np.ndarray:
+        # Embed through the coalescer so concurrent requests share one batched encoder call
+        try:
+            return await self._coalescer.submit(text)
+        except Exception as e:
+            # Retry on its own so one bad input does not fail every query it was batched with
+            logger.warning(f"Batched embedding failed, embedding query on its own: {e}")
+            return await asyncio.to_thread(self._generate_embedding, text)
+    
+    async def query_rag_system(self, query: str, top_k: int = 3, query_embedding: Optional[Sequence[float]] = None,
+                               metadata: bool = True, raise_on_error: bool = False) -> List[Dict]:
         # Query the RAG system and return top relevant documents.
+        # With metadata=False only {"id", "score"} pairs come back; resolve them later with hydrate_citations.
+        # Errors return an empty list unless raise_on_error is set, so callers that cache can tell them apart.
         if not self.initialized:
             logger.warning("RAG module not initialized, returning empty results")
             if self.initialization_error:
@@ -124,43 +196,101 @@ class RAGModule:
             logger.warning("Empty query provided")
             return []
         
+        cache_key = (query, top_k, metadata)
+        cached = self._query_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
             logger.info(f"Querying RAG system for: {query}")
             
-            # Generate embedding for the query
-            query_embedding = self._generate_embedding(query)
+            # Generate embedding for the query unless the caller already has one.
+            # The encoder and the Pinecone client are blocking, so both run in worker threads.
+            if query_embedding is None:
+                query_embedding = await self.embed_async(query)
             
             # Perform similarity search
-            results = self.index.query(
-                vector=query_embedding,
+            results = await asyncio.to_thread(
+                self.index.query,
+                vector=_as_list(query_embedding),
                 top_k=top_k,
-                include_metadata=True  # Ensure metadata is returned
+                include_metadata=metadata
             )
             
-            citations = []
-            for match in results.matches:
-                metadata = match.metadata or {}
-                # Get the source URL from the Pinecone record
-                source_url = metadata.get("url", metadata.get("source_url", "N/A"))
-                
-                citations.append({
-                    "title": metadata.get("title", "N/A"),
-                    "excerpt": metadata.get("excerpt", metadata.get("content", "No excerpt available.")[:200] + "..."),
-                    "source": source_url,  # Source field using the URL from Pinecone record
-                    "source_type": "Internal Database",
-                    "standard": metadata.get("standard", "unknown").upper(),
-                    "article_number": metadata.get("article_number", "N/A"),
-                    "document_type": metadata.get("document_type", "general"),
-                    "score": match.score  # Include score for debugging/analysis
-                })
+            if metadata:
+                citations = self._to_citations(results.matches)
+            else:
+                citations = [{"id": match.id, "score": match.score} for match in results.matches]
             
             logger.info(f"Retrieved {len(citations)} citations for query: {query}")
+            self._query_cache[cache_key] = citations
             return citations
             
         except Exception as e:
             logger.error(f"Error querying RAG system: {e}")
+            if raise_on_error:
+                raise
             return []  # Return empty list on error
     
+    async def query_rag_system_batch(self, queries: List[str], top_k: int = 3) -> List[List[Dict]]:
+        # Query several texts at once: uncached queries are embedded in one encoder call and
+        # their searches run concurrently over the shared gRPC channel. Results follow input order.
+        if not self.initialized:
+            logger.warning("RAG module not initialized, returning empty results")
+            return [[] for _ in queries]
+        
+        results: List[List[Dict]] = [[] for _ in queries]
+        pending: Dict[str, List[int]] = {}
+        for position, query in enumerate(queries):
+            if not query or not query.strip():
+                continue
+            cached = self._query_cache.get((query, top_k, True))
+            if cached is not None:
+                results[position] = cached
+            else:
+                pending.setdefault(query, []).append(position)
+        
+        if not pending:
+            return results
+        
+        try:
+            texts = list(pending)
+            embeddings = await asyncio.to_thread(self.embed_batch, texts)
+            responses = await asyncio.gather(*(
+                asyncio.to_thread(self.index.query, vector=embedding.tolist(), top_k=top_k, include_metadata=True)
+                for embedding in embeddings
+            ))
+        except Exception as e:
+            logger.error(f"Error querying RAG system in batch: {e}")
+            return results
+        
+        for query, response in zip(texts, responses):
+            citations = self._to_citations(response.matches)
+            self._query_cache[(query, top_k, True)] = citations
+            for position in pending[query]:
+                results[position] = citations
+        
+        logger.info(f"Retrieved citations for {len(texts)} batched queries")
+        return results
+    
+    async def hydrate_citations(self, matches: List[Dict]) -> List[Dict]:
+        # Resolve {"id", "score"} matches from a metadata-free query into full citations with one fetch.
+        if not matches:
+            return []
+        
+        try:
+            response = await asyncio.to_thread(self.index.fetch, ids=[match["id"] for match in matches])
+        except Exception as e:
+            logger.error(f"Error fetching citation metadata: {e}")
+            return []
+        
+        vectors = response.vectors
+        return [
+            self._citation(vectors[match["id"]].metadata, match["score"])
+            for match in matches
+            if match["id"] in vectors
+        ]
+    
     def process_query(self, query: str) -> List[Dict]:
         return self.query_rag_system(query)
     
@@ -197,4 +327,18 @@ class RAGModule:
             except Exception as e:
                 status["index_stats_error"] = str(e)
         
-        return status 
\ No newline at end of file
+        return status
+
+# Process-wide instance shared by the API and scripts, so the encoder weights are loaded only once
+_instance: Optional[RAGModule] = None
+_instance_lock = threading.Lock()
+
+def get_rag() -> RAGModule:
+    global _instance
+    if _instance is None:
+        with _instance_lock:
+            if _instance is None:
+                instance = RAGModule()
+                instance.initialize()
+                _instance = instance
+    return _instance
@@ -0,0 +1,111 @@
+# In-process response caches for the query pipeline.
+
+import hashlib
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Hashable, List, Optional, Sequence
+
+import numpy as np
+from cachetools import TTLCache
+
+# Seconds a cached response stays valid
+CACHE_TTL = 3600
+
+# Retrieved citations keyed on (query digest, use_rag, use_sonar)
+citation_cache: TTLCache = TTLCache(maxsize=1024, ttl=CACHE_TTL)
+
+# Hint responses keyed the same way; hints are derived only from the query and its citations
+hint_cache: TTLCache = TTLCache(maxsize=1024, ttl=CACHE_TTL)
+
+def query_key(text: str, *flags) -> tuple:
+    # Normalize case and surrounding whitespace so trivially different phrasings share an entry.
+    digest = hashlib.blake2b(text.strip().lower().encode(), digest_size=16).hexdigest()
+    return (digest, *flags)
+
+class SemanticCache:
+    # Approximate cache keyed on query embeddings. Random-hyperplane LSH tables narrow each
+    # lookup to a few candidates, which are then confirmed with an exact cosine check.
+    
+    def __init__(self, dim: int = 768, nbits: int = 8, tables: int = 4, threshold: float = 0.95,
+                 maxsize: int = 4096, ttl: float = CACHE_TTL, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self._planes = rng.standard_normal((tables, nbits, dim)).astype(np.float32)
+        self._threshold = threshold
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._next_id = 0
+        # entry id -> (flags, unit embedding, signatures, value, insert time), oldest first
+        self._entries: OrderedDict = OrderedDict()
+        # (table, signature) -> entry ids
+        self._buckets: defaultdict = defaultdict(set)
+    
+    def _unit(self, embedding: Sequence[float]) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+    
+    def _signatures(self, vec: np.ndarray) -> List[tuple]:
+        bits = np.packbits((self._planes @ vec) > 0, axis=-1)
+        return [(table, row.tobytes()) for table, row in enumerate(bits)]
+    
+    def _remove(self, entry_id: int):
+        _, _, signatures, _, _ = self._entries.pop(entry_id)
+        for signature in signatures:
+            bucket = self._buckets[signature]
+            bucket.discard(entry_id)
+            if not bucket:
+                del self._buckets[signature]
+    
+    def get(self, embedding: Sequence[float], flags: Hashable) -> Optional[Any]:
+        vec = self._unit(embedding)
+        candidates = set()
+        for signature in self._signatures(vec):
+            candidates.update(self._buckets.get(signature, ()))
+        
+        now = time.monotonic()
+        best_id, best_score = None, self._threshold
+        for entry_id in candidates:
+            entry_flags, entry_vec, _, _, inserted = self._entries[entry_id]
+            # Expired entries count as misses, matching the exact caches' TTL
+            if now - inserted >= self._ttl:
+                self._remove(entry_id)
+                continue
+            if entry_flags != flags:
+                continue
+            score = float(entry_vec @ vec)
+            if score >= best_score:
+                best_id, best_score = entry_id, score
+        
+        if best_id is None:
+            return None
+        self._entries.move_to_end(best_id)
+        return self._entries[best_id][3]
+    
+    def put(self, embedding: Sequence[float], flags: Hashable, value: Any):
+        vec = self._unit(embedding)
+        signatures = self._signatures(vec)
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = (flags, vec, signatures, value, time.monotonic())
+        for signature in signatures:
+            self._buckets[signature].add(entry_id)
+        
+        # Evict least recently used entries
+        while len(self._entries) > self._maxsize:
+            self._remove(next(iter(self._entries)))
+    
+    def clear(self):
+        self._entries.clear()
+        self._buckets.clear()
+
+# Citations for paraphrased queries, keyed on (use_rag, use_sonar) plus the query embedding
+semantic_cache = SemanticCache(ttl=CACHE_TTL)
+
+# Hint responses for paraphrased queries, keyed the same way
+semantic_hint_cache = SemanticCache(ttl=CACHE_TTL)
+
+def clear():
+    citation_cache.clear()
+    hint_cache.clear()
+    semantic_cache.clear()
+    semantic_hint_cache.clear()
@@ -1,24 +1,135 @@
 import os
 import re
+import itertools
 import logging
 import asyncio
+import threading
+import weakref
 import aiohttp
-import dotenv
-from typing import List, Dict, Optional
-from tenacity import retry, stop_after_attempt, wait_exponential
+import ahocorasick
+import orjson
+from typing import List, Dict, Optional, Tuple
+from cachetools import TTLCache
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+
+from . import http_pool
+from .config import load_env
 
 # Load environment variables 
-dotenv.load_dotenv()
+load_env()
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Fallback URL extraction from the answer text. The length cap bounds the work per match, and
+# only the head of the answer is searched since just the first few links are kept.
+_URL_RE = re.compile(r'https?://[^\s\]\)]{1,2048}')
+_URL_SEARCH_CHARS = 65536
+
+# Regulatory references mentioned in the answer text, one alternative per kind so the
+# answer is scanned in a single pass. The alternation sits in a zero-width lookahead so every
+# start position is tried and overlapping references of different kinds are all found.
+_CITATION_RE = re.compile(
+    r'(?='
+    r'(?P<sec>SEC[- ]?\d+[- ]?\d*)'  # SEC regulations
+    r'|(?P<gdpr>GDPR[- ]?Article[- ]?\d+)'  # GDPR articles
+    r'|(?P<sox>SOX[- ]?Section[- ]?\d+)'  # SOX sections
+    r'|(?P<regulation>Regulation[- ]?[A-Z]+)'  # General regulations
+    r')',
+    re.IGNORECASE
+)
+_CITATION_KINDS = ("sec", "gdpr", "sox", "regulation")
+
+# Prompts for the citation search; only the user query varies between calls
+_SYSTEM_PROMPT = (
+    "You are an expert compliance and legal research assistant trained in analyzing and citing complex regulatory frameworks. "
+    "Your job is to help compliance teams, auditors, and legal analysts retrieve specific, actionable information about regulatory obligations. "
+    "You must prioritize official sources from government websites and regulatory bodies, such as EU Commission, SEC, FTC, EDPB, U.S. Congress, NIST, or ISO. "
+    "Each answer must include article or section numbers, plain-language interpretation, enforcement history (if available), and practical steps companies have taken to meet compliance."
+    "\n\n"
+    "Always ensure:"
+    "- Every citation is tied to a named law or regulation (e.g., GDPR, SOX, HIPAA, CCPA, PCI DSS)."
+    "- You include only reliable links from government or regulator-hosted sources."
+    "- You mention the applicable jurisdictions (e.g., EU, California, U.S. federal)."
+    "- You clarify what is **required by law**, what is **recommended guidance**, and what is **industry best practice**."
+    "- You structure the output in a way that supports easy parsing and indexing in compliance tools (e.g., RAG pipelines)."
+    "\n\n"
+    "DO NOT answer with speculative advice, general blogs, or unverified interpretations. You must be exact, legally accurate, and citation-focused."
+)
+
+# Appended to the user query to ask for specific, citable guidance
+_QUERY_GUIDANCE = (
+    ". Provide specific legal guidance, exact citations, and implementation context."
+    " The response must include:"
+    " 1. The exact title and number of any relevant regulatory articles, sections, or clauses (e.g., GDPR Article 33, SOX Section 302, HIPAA §164.308)."
+    " 2. The full text excerpt or summary of the requirement from the regulation."
+    " 3. A URL linking to the official regulation or government publication (e.g., gdpr-info.eu, govinfo.gov, ec.europa.eu, ftc.gov, edpb.europa.eu, oag.ca.gov, sec.gov)."
+    " 4. Real-world implementation advice (e.g., what organizations typically do to comply)."
+    " 5. Notable enforcement actions, penalties, or compliance rulings if available."
+    " 6. Clearly indicate which jurisdiction(s) the regulation applies to (e.g., EU, US, global)."
+    " 7. If multiple regulations are relevant, list each with its associated guidance."
+    " Avoid vague summaries, news articles, or blog posts unless they cite or link to authoritative regulatory documents."
+)
+
+def _payload_parts() -> Tuple[bytes, bytes, bytes]:
+    # Serialize the request body once around two placeholders, so each call only encodes the
+    # model name and the user content instead of re-escaping the whole system prompt
+    template = orjson.dumps({
+        "model": "\x00model\x00",
+        "messages": [
+            {"role": "system", "content": _SYSTEM_PROMPT},
+            {"role": "user", "content": "\x00query\x00"}
+        ],
+        "stream": False
+    })
+    head, rest = template.split(orjson.dumps("\x00model\x00"))
+    middle, tail = rest.split(orjson.dumps("\x00query\x00"))
+    return head, middle, tail
+
+_PAYLOAD_HEAD, _PAYLOAD_MIDDLE, _PAYLOAD_TAIL = _payload_parts()
+
+# Citation type rules for _determine_citation_type: title keywords first, then source domains,
+# then generic compliance wording in the title
+_TITLE_TYPE_RULES = (
+    ('sec', "SEC"), ('securities', "SEC"), ('exchange', "SEC"),
+    ('gdpr', "GDPR"), ('general data protection', "GDPR"),
+    ('sox', "SOX"), ('sarbanes', "SOX"), ('oxley', "SOX"),
+)
+_URL_TYPE_RULES = (
+    ('sec.gov', "SEC"),
+    ('europa.eu', "GDPR"),
+)
+_FALLBACK_TITLE_TYPE_RULES = (
+    ('regulation', "Compliance"), ('compliance', "Compliance"), ('legal', "Compliance"),
+)
+
+def _rule_automaton(rules) -> ahocorasick.Automaton:
+    # Maps each keyword to its index in the rule table
+    automaton = ahocorasick.Automaton()
+    for index, (keyword, _) in enumerate(rules):
+        automaton.add_word(keyword, index)
+    automaton.make_automaton()
+    return automaton
+
+# Title automaton covers the specific rules followed by the generic fallback rules
+_TITLE_TYPE_AUTOMATON = _rule_automaton(_TITLE_TYPE_RULES + _FALLBACK_TITLE_TYPE_RULES)
+_URL_TYPE_AUTOMATON = _rule_automaton(_URL_TYPE_RULES)
+
 class SonarModule:
     def __init__(self):
         self.initialized = False
         self.api_key: Optional[str] = None
         self.api_url = "https://api.perplexity.ai/chat/completions"
+        self._headers: Dict[str, str] = {}
+        # Shared HTTP sessions so keep-alive connections (and their TLS handshakes) are reused.
+        # Sessions are bound to the loop that created them, so there is one per event loop.
+        self._sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = weakref.WeakKeyDictionary()
+        # Background loop used by analyze_query_sync, started on first use
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        # Parsed citations keyed on (normalized query, model); only successful calls are stored
+        self._citation_cache: TTLCache = TTLCache(maxsize=512, ttl=3600)
     
     def initialize(self, api_key: str = None):
         try:
@@ -28,6 +139,13 @@ class SonarModule:
             if not self.api_key:
                 raise ValueError("PERPLEXITY_API_KEY not provided or found in environment")
             
+            # Request headers only depend on the key, so build them once
+            self._headers = {
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json",
+                "Accept": "application/json"
+            }
+            
             self.initialized = True
             logger.info("Sonar module initialized successfully")
             
@@ -35,77 +153,78 @@ class SonarModule:
             logger.error(f"Error initializing Sonar module: {e}")
             raise
     
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    async def _make_api_request(self, payload: dict) -> dict:
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "Accept": "application/json"
-        }
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                self.api_url, 
-                headers=headers, 
-                json=payload, 
+    def _get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                connector=http_pool.get_connector(),
+                connector_owner=False,
                 timeout=aiohttp.ClientTimeout(total=30)
-            ) as response:
-                response.raise_for_status()
-                return await response.json()
+            )
+            self._sessions[loop] = session
+        return session
     
-    async def fetch_perplexity_sonar_citations(self, query: str, model: str = "sonar") -> List[Dict]:
+    async def close(self):
+        current = asyncio.get_running_loop()
+        for loop, session in list(self._sessions.items()):
+            if session.closed:
+                continue
+            if loop is current:
+                await session.close()
+            elif loop.is_running():
+                # Close it on its own loop rather than touch it from this one
+                asyncio.run_coroutine_threadsafe(session.close(), loop)
+            else:
+                # Nothing can be using it any more, and it does not own the pooled connector
+                session.detach()
+        self._sessions.clear()
+    
+    async def __aenter__(self) -> "SonarModule":
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+    
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=0.5, min=0.5, max=4),
+        retry=retry_if_exception_type((aiohttp.ClientError, asyncio.TimeoutError)),
+        reraise=True
+    )
+    async def _make_api_request(self, body: bytes) -> dict:
+        session = self._get_session()
+        async with session.post(
+            self.api_url, 
+            headers=self._headers, 
+            data=body
+        ) as response:
+            response.raise_for_status()
+            return orjson.loads(await response.read())
+    
+    async def fetch_perplexity_sonar_citations(self, query: str, model: str = "sonar", raise_on_error: bool = False) -> List[Dict]:
         #Fetches compliance citations using the Perplexity Sonar API and normalizes them.
+        # API errors return an empty list unless raise_on_error is set.
         if not self.initialized:
             raise RuntimeError("Sonar module not initialized")
         
+        # Case and whitespace differences do not change the answer, so they share an entry
+        cache_key = (" ".join(query.lower().split()), model)
+        cached = self._citation_cache.get(cache_key)
+        if cached is not None:
+            return list(cached)
+        
         normalized_citations = []
         
         # Enhance query for compliance-focused search with specific guidance request
-        enhanced_query = (
-            f"{query}. Provide specific legal guidance, exact citations, and implementation context."
-            " The response must include:"
-            " 1. The exact title and number of any relevant regulatory articles, sections, or clauses (e.g., GDPR Article 33, SOX Section 302, HIPAA §164.308)."
-            " 2. The full text excerpt or summary of the requirement from the regulation."
-            " 3. A URL linking to the official regulation or government publication (e.g., gdpr-info.eu, govinfo.gov, ec.europa.eu, ftc.gov, edpb.europa.eu, oag.ca.gov, sec.gov)."
-            " 4. Real-world implementation advice (e.g., what organizations typically do to comply)."
-            " 5. Notable enforcement actions, penalties, or compliance rulings if available."
-            " 6. Clearly indicate which jurisdiction(s) the regulation applies to (e.g., EU, US, global)."
-            " 7. If multiple regulations are relevant, list each with its associated guidance."
-            " Avoid vague summaries, news articles, or blog posts unless they cite or link to authoritative regulatory documents."
-        )
-
-        payload = {
-            "model": model,
-            "messages": [
-                {
-                    "role": "system",
-                    "content": (
-                        "You are an expert compliance and legal research assistant trained in analyzing and citing complex regulatory frameworks. "
-                        "Your job is to help compliance teams, auditors, and legal analysts retrieve specific, actionable information about regulatory obligations. "
-                        "You must prioritize official sources from government websites and regulatory bodies, such as EU Commission, SEC, FTC, EDPB, U.S. Congress, NIST, or ISO. "
-                        "Each answer must include article or section numbers, plain-language interpretation, enforcement history (if available), and practical steps companies have taken to meet compliance."
-                        "\n\n"
-                        "Always ensure:"
-                        "- Every citation is tied to a named law or regulation (e.g., GDPR, SOX, HIPAA, CCPA, PCI DSS)."
-                        "- You include only reliable links from government or regulator-hosted sources."
-                        "- You mention the applicable jurisdictions (e.g., EU, California, U.S. federal)."
-                        "- You clarify what is **required by law**, what is **recommended guidance**, and what is **industry best practice**."
-                        "- You structure the output in a way that supports easy parsing and indexing in compliance tools (e.g., RAG pipelines)."
-                        "\n\n"
-                        "DO NOT answer with speculative advice, general blogs, or unverified interpretations. You must be exact, legally accurate, and citation-focused."
-                    )
-                },
-                {
-                    "role": "user",
-                    "content": enhanced_query
-                }
-            ],
-            "stream": False
-        }
-
+        body = b"".join((
+            _PAYLOAD_HEAD, orjson.dumps(model),
+            _PAYLOAD_MIDDLE, orjson.dumps(query + _QUERY_GUIDANCE),
+            _PAYLOAD_TAIL
+        ))
         
         try:
-            data = await self._make_api_request(payload)
+            data = await self._make_api_request(body)
             
             # Parse Perplexity API response for citations
             if 'choices' in data and data['choices']:
@@ -143,8 +262,9 @@ class SonarModule:
                 
                 # Fallback: extract URLs from content
                 elif 'content' in message and "http" in message['content']:
-                    urls = re.findall(r'https?://[^\s\]\)]+', message['content'])
-                    for url in urls[:5]:  # Limit to first 5 URLs
+                    # Stop scanning once the first 5 URLs are found
+                    urls = _URL_RE.finditer(message['content'], 0, _URL_SEARCH_CHARS)
+                    for url in (found.group() for found in itertools.islice(urls, 5)):
                         citation_type = self._determine_citation_type("", url)
                         normalized_citations.append({
                             "title": f"Link from Perplexity: {url[:50]}...",
@@ -155,72 +275,72 @@ class SonarModule:
                 
                 # Additional parsing for citations mentioned in content
                 content = message.get('content', '')
-                citation_patterns = [
-                    r'SEC[- ]?\d+[- ]?\d*',  # SEC regulations
-                    r'GDPR[- ]?Article[- ]?\d+',  # GDPR articles
-                    r'SOX[- ]?Section[- ]?\d+',  # SOX sections
-                    r'Regulation[- ]?[A-Z]+',  # General regulations
-                ]
+                # References are grouped by kind so they are added in the same order as before
+                matches_by_kind = {kind: [] for kind in _CITATION_KINDS}
+                for found in _CITATION_RE.finditer(content):
+                    matches_by_kind[found.lastgroup].append(found.group(found.lastgroup))
                 
-                for pattern in citation_patterns:
-                    matches = re.findall(pattern, content, re.IGNORECASE)
+                # Every title lower-cased once and joined, so each dedup check is a single substring
+                # search. Matches never contain a newline, so they cannot span two titles.
+                seen_titles = "\n".join(cite['title'].lower() for cite in normalized_citations)
+                for matches in matches_by_kind.values():
                     for match in matches:
-                        if not any(match.lower() in cite['title'].lower() for cite in normalized_citations):
+                        if match.lower() not in seen_titles:
+                            title = f"Regulatory Reference: {match}"
+                            seen_titles += "\n" + title.lower()
                             normalized_citations.append({
-                                "title": f"Regulatory Reference: {match}",
+                                "title": title,
                                 "date": None,
                                 "url": f"https://www.sec.gov/search?query={match.replace(' ', '+')}",
                                 "type": "Regulatory Reference"
                             })
             
             logger.info(f"Retrieved {len(normalized_citations)} citations from Perplexity Sonar for query: {query}")
+            self._citation_cache[cache_key] = tuple(normalized_citations)
             
         except aiohttp.ClientError as e:
             logger.error(f"Network error during Perplexity Sonar API call: {e}")
-        except asyncio.TimeoutError:
-            logger.error("Perplexity Sonar API request timed out")
+            if raise_on_error:
+                raise
         except Exception as e:
             logger.error(f"Unexpected error during Perplexity Sonar API call: {e}")
+            if raise_on_error:
+                raise
         
         return normalized_citations
     
     def _determine_citation_type(self, title: str, url: str) -> str:
-        # Determine the type of citation based on title and URL.
-        title_lower = title.lower()
-        url_lower = url.lower()
+        # Determine the type of citation based on title and URL. Each automaton reports every
+        # keyword in one pass; the lowest rule index among the hits decides, as in table order.
+        title_rule = min((rule for _, rule in _TITLE_TYPE_AUTOMATON.iter(title.lower())), default=None)
+        if title_rule is not None and title_rule < len(_TITLE_TYPE_RULES):
+            return _TITLE_TYPE_RULES[title_rule][1]
         
-        if any(keyword in title_lower for keyword in ['sec', 'securities', 'exchange']):
-            return "SEC"
-        elif any(keyword in title_lower for keyword in ['gdpr', 'general data protection']):
-            return "GDPR"
-        elif any(keyword in title_lower for keyword in ['sox', 'sarbanes', 'oxley']):
-            return "SOX"
-        elif any(domain in url_lower for domain in ['sec.gov', 'europa.eu']):
-            if 'sec.gov' in url_lower:
-                return "SEC"
-            elif 'europa.eu' in url_lower:
-                return "GDPR"
-        elif any(keyword in title_lower for keyword in ['regulation', 'compliance', 'legal']):
-            return "Compliance"
-        else:
-            return "External Citation"
+        url_rule = min((rule for _, rule in _URL_TYPE_AUTOMATON.iter(url.lower())), default=None)
+        if url_rule is not None:
+            return _URL_TYPE_RULES[url_rule][1]
+        
+        if title_rule is not None:
+            return _FALLBACK_TITLE_TYPE_RULES[title_rule - len(_TITLE_TYPE_RULES)][1]
+        
+        return "External Citation"
     
     async def analyze_query(self, query: str) -> dict:
+        # Always returns a dict with a "citations" list (empty on error); callers rely on this contract.
+        # A failed API call is reported through an "error" key.
         if not self.initialized:
             raise RuntimeError("Sonar module not initialized")
         
         try:
-            citations = await self.fetch_perplexity_sonar_citations(query)
+            citations = await self.fetch_perplexity_sonar_citations(query, raise_on_error=True)
             
             analysis = {
                 "query": query,
                 "citations_found": len(citations),
                 "citations": citations,
                 "analysis_summary": f"Found {len(citations)} relevant compliance citations",
-                "citation_types": list(set(
-                    str(cite.get('type', 'Unknown')) if cite.get('type') is not None 
-                    else 'Unknown' for cite in citations
-                ))
+                # Types are always set to a non-empty string by the fetch path
+                "citation_types": list({cite.get('type') or 'Unknown' for cite in citations})
             }
             
             return analysis
@@ -236,6 +356,25 @@ class SonarModule:
                 "error": str(e)
             }
     
+    async def analyze_queries(self, queries: List[str], concurrency: int = 8) -> List[dict]:
+        # Analyze several queries concurrently over the shared session. The semaphore keeps the
+        # number of in-flight Perplexity calls bounded to stay clear of rate limits.
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def analyze_one(query: str) -> dict:
+            async with semaphore:
+                return await self.analyze_query(query)
+        
+        return await asyncio.gather(*(analyze_one(query) for query in queries))
+    
+    def _background_loop(self) -> asyncio.AbstractEventLoop:
+        # Long-lived loop on a daemon thread for the sync wrapper, so its HTTP session survives between calls
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="sonar-module-loop", daemon=True).start()
+        return self._loop
+    
     # Synchronous wrapper for backward compatibility
     def analyze_query_sync(self, query: str) -> dict:
-        return asyncio.run(self.analyze_query(query)) 
\ No newline at end of file
+        return asyncio.run_coroutine_threadsafe(self.analyze_query(query), self._background_loop()).result()
\ No newline at end of file
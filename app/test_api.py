@@ -1,12 +1,15 @@
 import requests
 import json
-import time
+import orjson
 
 API_BASE_URL = "http://localhost:8000"
 
+# One keep-alive session for every request the tests make
+SESSION = requests.Session()
+
 def test_health():
     print("Testing health endpoint...")
-    response = requests.get(f"{API_BASE_URL}/health")
+    response = SESSION.get(f"{API_BASE_URL}/health", timeout=10)
     if response.status_code == 200:
         print("✅ Health check passed")
         print(json.dumps(response.json(), indent=2))
@@ -28,7 +31,7 @@ def test_query_endpoint():
     }
     
     try:
-        response = requests.post(
+        response = SESSION.post(
             f"{API_BASE_URL}/query",
             json=payload,
             timeout=60
@@ -65,7 +68,7 @@ def test_streaming_endpoint():
     }
     
     try:
-        response = requests.post(
+        response = SESSION.post(
             f"{API_BASE_URL}/chat",
             json=payload,
             stream=True,
@@ -76,16 +79,16 @@ def test_streaming_endpoint():
             print("✅ Streaming endpoint accessible")
             print("Stream data:")
             
-            for line in response.iter_lines():
-                if line:
-                    line_str = line.decode('utf-8')
-                    if line_str.startswith('data: '):
-                        data = line_str[6:]  # Remove 'data: ' prefix
-                        try:
-                            parsed_data = json.loads(data)
-                            print(f"  - {parsed_data.get('status', parsed_data)}")
-                        except json.JSONDecodeError:
-                            print(f"  - {data}")
+            # SSE is UTF-8; make sure iter_lines decodes even if the header omits the charset
+            response.encoding = response.encoding or "utf-8"
+            for line in response.iter_lines(chunk_size=8192, decode_unicode=True):
+                if line.startswith('data: '):
+                    data = line.removeprefix('data: ')
+                    try:
+                        parsed_data = orjson.loads(data)
+                        print(f"  - {parsed_data.get('status', parsed_data)}")
+                    except orjson.JSONDecodeError:
+                        print(f"  - {data}")
         else:
             print("❌ Streaming endpoint test failed")
             print(f"Status: {response.status_code}")
@@ -105,18 +108,13 @@ def main():
     # Test health endpoint first
     test_health()
     
-    # Wait a moment
-    time.sleep(1)
-    
-    # Test query endpoint
+    # Test query endpoint; it also loads the sample data the streaming test queries
     test_query_endpoint()
     
-    # Wait a moment
-    time.sleep(1)
-    
     # Test streaming endpoint
     test_streaming_endpoint()
     
+    SESSION.close()
     print("All tests completed!")
 
 if __name__ == "__main__":
@@ -2,8 +2,11 @@
 # Demo script for Regulatory Compliance Assistant MVP
 # Showcases the system's capabilities with example compliance queries.
 
+import os
 import asyncio
-import json
+import argparse
+import threading
+import orjson
 import sys
 from typing import Dict, Any
 import dotenv
@@ -11,7 +14,28 @@ import dotenv
 # Load environment variables 
 dotenv.load_dotenv()
 
-async def demo_query(query_text: str, description: str = "") -> Dict[Any, Any]:
+# Citations for paraphrased demo queries, keyed on the query embedding; built on first use
+_rag_cache = None
+
+async def _resolved(value):
+    return value
+
+async def query_internal(rag, query_text: str):
+    # Serve a close paraphrase of an earlier query from the approximate cache instead of searching the index again
+    global _rag_cache
+    if _rag_cache is None:
+        from app.response_cache import SemanticCache
+        _rag_cache = SemanticCache(threshold=0.95, maxsize=256)
+    
+    query_embedding = await rag.embed_async(query_text)
+    citations = _rag_cache.get(query_embedding, "rag")
+    if citations is None:
+        citations = await rag.query_rag_system(query_text, query_embedding=query_embedding)
+        if citations:
+            _rag_cache.put(query_embedding, "rag", citations)
+    return citations
+
+async def demo_query(query_text: str, description: str = "", rag=None, sonar=None, hint=None) -> Dict[Any, Any]:
     # Demonstrate a single query to the compliance assistant.
     print(f"\n{'='*60}")
     print(f"🔍 DEMO: {description or query_text}")
@@ -20,42 +44,36 @@ async def demo_query(query_text: str, description: str = "") -> Dict[Any, Any]:
     print("-" * 60)
     
     try:
-        # Import the modules
-        from app.rag_module import RAGModule
-        from app.sonar_module import SonarModule  
-        from app.hint_module import HintModule
-        
-        # Initialize modules
-        rag = RAGModule()
-        sonar = SonarModule()
-        hint = HintModule()
-        
-        print("🔧 Initializing modules...")
-        rag.initialize()
-        sonar.initialize()
-        hint.initialize()
+        if rag is None or sonar is None or hint is None:
+            rag, sonar, hint = init_modules()
         
-        # Check initialization status
-        if not rag.initialized:
-            print("⚠️  RAG module not initialized - may need Pinecone setup")
-        if not sonar.initialized:
-            print("⚠️  Sonar module not initialized - may need Perplexity API key")
-        if not hint.initialized:
-            print("⚠️  Hint module not initialized")
-        
-        # Perform queries
+        # Perform queries; internal and external lookups are independent, so they run concurrently
         internal_citations = []
         external_citations = []
         
         if rag.initialized:
             print("📚 Querying internal documents...")
-            internal_citations = await rag.query_rag_system(query_text)
+        if sonar.initialized:
+            print("🌐 Querying external sources...")
+        
+        internal_result, sonar_result = await asyncio.gather(
+            query_internal(rag, query_text) if rag.initialized else _resolved([]),
+            sonar.analyze_query(query_text) if sonar.initialized else _resolved({}),
+            return_exceptions=True
+        )
+        
+        if rag.initialized:
+            if isinstance(internal_result, Exception):
+                print(f"⚠️  Internal query failed: {internal_result}")
+            else:
+                internal_citations = internal_result
             print(f"   Found {len(internal_citations)} internal citations")
         
         if sonar.initialized:
-            print("🌐 Querying external sources...")
-            sonar_result = await sonar.analyze_query(query_text)
-            external_citations = sonar_result.get('citations', []) if isinstance(sonar_result, dict) else []
+            if isinstance(sonar_result, Exception):
+                print(f"⚠️  External query failed: {sonar_result}")
+            elif isinstance(sonar_result, dict):
+                external_citations = sonar_result.get('citations', [])
             print(f"   Found {len(external_citations)} external citations")
         
         # Generate hints
@@ -107,7 +125,37 @@ async def demo_query(query_text: str, description: str = "") -> Dict[Any, Any]:
         print(f"Traceback: {traceback.format_exc()}")
         return {"error": str(e)}
 
-async def run_demo():
+def prewarm():
+    # Load the RAG module and its sentence-transformers model in the background while the demo starts up
+    try:
+        from app.rag_module import get_rag
+        get_rag()
+    except Exception:
+        pass  # init_modules reports any failure when the demo needs the module
+
+def init_modules():
+    # Build the modules once; every demo query reuses the loaded model and open clients
+    from app.rag_module import get_rag
+    from app.sonar_module import SonarModule
+    from app.hint_module import get_hint
+    
+    print("🔧 Initializing modules...")
+    rag = get_rag()
+    sonar = SonarModule()
+    hint = get_hint()
+    sonar.initialize()
+    
+    # Check initialization status
+    if not rag.initialized:
+        print("⚠️  RAG module not initialized - may need Pinecone setup")
+    if not sonar.initialized:
+        print("⚠️  Sonar module not initialized - may need Perplexity API key")
+    if not hint.initialized:
+        print("⚠️  Hint module not initialized")
+    
+    return rag, sonar, hint
+
+async def run_demo(interactive: bool = True):
     # Run a comprehensive demo of the Regulatory Compliance Assistant.
     print("🚀 Regulatory Compliance Assistant MVP Demo")
     print("🤖 This demo showcases the system's capabilities with example queries")
@@ -129,17 +177,26 @@ async def run_demo():
         }
     ]
     
+    # get_rag() waits for a prewarm still in progress; waiting on a thread keeps the event loop free
+    rag, sonar, hint = await asyncio.to_thread(init_modules)
     results = []
     
-    for i, query_info in enumerate(demo_queries, 1):
-        print(f"\n🎯 Running Demo {i}/{len(demo_queries)}")
-        result = await demo_query(query_info["text"], query_info["description"])
-        results.append(result)
-        
-        # Pause between queries for readability
-        if i < len(demo_queries):
-            print("\n⏸️  Press Enter to continue to next demo...")
-            input()
+    try:
+        for i, query_info in enumerate(demo_queries, 1):
+            print(f"\n🎯 Running Demo {i}/{len(demo_queries)}")
+            result = await demo_query(query_info["text"], query_info["description"], rag, sonar, hint)
+            results.append(result)
+            
+            # Pause between queries for readability; the prompt waits on a thread, not the event loop
+            if interactive and i < len(demo_queries):
+                print("\n⏸️  Press Enter to continue to next demo...")
+                await asyncio.to_thread(input)
+    finally:
+        # Release pooled upstream connections, in the same order as the API shutdown
+        from app import http_pool
+        await sonar.close()
+        await hint.close()
+        await http_pool.shutdown()
     
     # Summary
     print(f"\n{'='*80}")
@@ -162,19 +219,33 @@ async def run_demo():
 
 def main():
     # Main function to run the demo.
+    parser = argparse.ArgumentParser(description="Regulatory Compliance Assistant demo")
+    parser.add_argument("--non-interactive", action="store_true",
+                        help="run every query without pausing (also set by DEMO_NONINTERACTIVE=1)")
+    parser.add_argument("--save", action="store_true",
+                        help="save the results to demo_results.json without asking")
+    args = parser.parse_args()
+    interactive = not (args.non_interactive or os.environ.get("DEMO_NONINTERACTIVE") == "1")
+    threading.Thread(target=prewarm, daemon=True).start()
+    
     print("Starting Regulatory Compliance Assistant Demo...")
     
     try:
         # Run the async demo
-        results = asyncio.run(run_demo())
+        results = asyncio.run(run_demo(interactive))
         
         # Optional: Save results to file
-        print(f"\n💾 Would you like to save the demo results to a file? (y/n): ", end="")
-        save_results = input().lower().strip()
+        if args.save:
+            save_results = 'y'
+        elif interactive:
+            print(f"\n💾 Would you like to save the demo results to a file? (y/n): ", end="")
+            save_results = input().lower().strip()
+        else:
+            save_results = 'n'
         
         if save_results == 'y':
-            with open('demo_results.json', 'w') as f:
-                json.dump(results, f, indent=2, default=str)
+            with open('demo_results.json', 'wb') as f:
+                f.write(orjson.dumps(results, default=str, option=orjson.OPT_INDENT_2))
             print("📁 Results saved to demo_results.json")
         
     except KeyboardInterrupt:
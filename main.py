@@ -1,3 +1,4 @@
+import sys
 import uvicorn
 from app.config import config
 from app.api import app
@@ -24,5 +25,10 @@ if __name__ == "__main__":
         host=config.API_HOST,
         port=config.API_PORT,
         reload=config.DEBUG,
-        log_level=config.LOG_LEVEL.lower()
+        log_level=config.LOG_LEVEL.lower(),
+        # uvloop and httptools cut per-request event loop and parsing overhead (uvloop has no Windows build)
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        # Per-request access logging is only useful while debugging
+        access_log=config.DEBUG
     ) 
\ No newline at end of file
@@ -1,71 +1,91 @@
 
-import requests
-import time
-import json
-import xml.etree.ElementTree as ET
+import asyncio
+import aiohttp
+from concurrent.futures import ProcessPoolExecutor
+import orjson
+import io
+from lxml import etree
 from bs4 import BeautifulSoup
 import re
 
 SITEMAP_URL  = "https://gdpr-info.eu/page-sitemap.xml"
 OUTPUT_FILE  = "gdpr_articles.json"
+CONCURRENCY  = 8  # article pages fetched at once
+RATE_LIMIT   = 8  # request starts per second across all fetches
+
+# Namespace-qualified sitemap tags
+SITEMAP_NS   = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+URL_TAG      = SITEMAP_NS + "url"
+LOC_TAG      = SITEMAP_NS + "loc"
+
+# Navigation markers that identify footer paragraphs/divs inside an article
+FOOTER_RE = re.compile(r"←|→|GDPR|Table of contents|Report error")
+
+# Runs of whitespace and special characters (anything but word chars and basic punctuation)
+# collapse to a single space in one pass
+NOISE_RE = re.compile(r'(?:[^\w\s\.\,\;\:\(\)\-\'\"\?!]|\s)+')
+
+# Leading "Art/Article X GDPR" prefix: Art. 16 GDPR, Article 16 - GDPR, Art 16 -, Article 16, etc.
+TITLE_PREFIX_RE = re.compile(r'^(?:Art\.?|Article)\s*\d+\s*[-:]?\s*(?:GDPR\s*[-:]?\s*)?', re.IGNORECASE)
 
 def clean_text(text):
     # Clean text by removing special characters and normalizing whitespace.
     if not text:
         return ""
     
-    # Remove or replace special characters, keeping basic punctuation
-    cleaned = re.sub(r'[^\w\s\.\,\;\:\(\)\-\'\"\?!]', ' ', text)
-    
-    # Normalize whitespace - replace multiple spaces/newlines with single space
-    cleaned = re.sub(r'\s+', ' ', cleaned)
-    
-    return cleaned.strip()
+    # Replace special characters, keeping basic punctuation, and normalize whitespace
+    return NOISE_RE.sub(' ', text).strip()
 
 def clean_title(title):
     if not title:
         return ""
     
-    # Remove various "Art/Article X GDPR" patterns from the beginning
-    patterns_to_remove = [
-        r'^Art\.?\s*\d+\s*[-:]?\s*GDPR\s*[-:]?\s*',  # Art. 16 GDPR, Art 16 - GDPR, etc.
-        r'^Article\s*\d+\s*[-:]?\s*GDPR\s*[-:]?\s*',  # Article 16 GDPR, Article 16 - GDPR, etc.
-        r'^Art\.?\s*\d+\s*[-:]?\s*',                  # Art. 16, Art 16 -, etc. (without GDPR)
-        r'^Article\s*\d+\s*[-:]?\s*',                 # Article 16, Article 16 -, etc. (without GDPR)
-    ]
-    
-    cleaned_title = title
-    for pattern in patterns_to_remove:
-        cleaned_title = re.sub(pattern, '', cleaned_title, flags=re.IGNORECASE)
-        # If we removed something, break to avoid over-processing
-        if cleaned_title != title:
-            break
+    # Remove the "Art/Article X GDPR" prefix from the beginning
+    cleaned_title = TITLE_PREFIX_RE.sub('', title, count=1)
     
     # Clean any remaining special characters
     cleaned_title = clean_text(cleaned_title)
     
     return cleaned_title
 
-def get_sitemap_article_links():
+class RateLimiter:
+    # Spaces request starts evenly, so a slow response does not also pay a fixed pause afterwards
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self.next_start = 0.0
 
-    resp = requests.get(SITEMAP_URL)
-    resp.raise_for_status()
-    root = ET.fromstring(resp.content)
-    ns   = {"sm": "http://www.sitemaps.org/schemas/sitemap/0.9"}
+    async def wait(self):
+        now = asyncio.get_running_loop().time()
+        start = max(now, self.next_start)
+        self.next_start = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
 
+async def get_sitemap_article_links(session):
+
+    async with session.get(SITEMAP_URL) as resp:
+        resp.raise_for_status()
+        body = await resp.read()
+
+    # Stream through the <url> entries instead of building the whole tree
     links = []
-    for url in root.findall("sm:url", ns):
-        loc = url.find("sm:loc", ns)
-        if loc is not None and "/art-" in loc.text and loc.text.endswith("/"):
-            links.append(loc.text)
+    for _, url in etree.iterparse(io.BytesIO(body), tag=URL_TAG):
+        loc = url.findtext(LOC_TAG)
+        if loc is not None and "/art-" in loc and loc.endswith("/"):
+            links.append(loc)
+        url.clear()
     print(f"[+] Found {len(links)} article URLs in sitemap")
     return links
 
-def parse_article(url):
+async def fetch_article(session, url):
+
+    async with session.get(url) as resp:
+        resp.raise_for_status()
+        return await resp.text()
 
-    resp = requests.get(url)
-    resp.raise_for_status()
-    soup = BeautifulSoup(resp.text, "html.parser")
+def parse_article(url, html):
+    # CPU-bound; runs in a worker process so pages are parsed on several cores at once
+    soup = BeautifulSoup(html, "lxml")
 
     # Title
     title_tag = soup.find("h1")
@@ -96,13 +116,9 @@ def parse_article(url):
         unwanted.decompose()
 
     # Fallback: strip out any paragraphs/divs containing navigation markers
-    def is_footer(tag):
-        txt = tag.get_text()
-        return any(marker in txt for marker in [
-            "←", "→", "GDPR", "Table of contents", "Report error"
-        ])
-    for footer in content_div.find_all(lambda t: t.name in ("p", "div") and is_footer(t)):
-        footer.decompose()
+    for footer in content_div.find_all(("p", "div")):
+        if FOOTER_RE.search(footer.get_text()):
+            footer.decompose()
 
     # Extract clean text
     raw_content = content_div.get_text(separator="\n", strip=True)
@@ -116,28 +132,62 @@ def parse_article(url):
         "content":        content
     }
 
-def main():
-    articles = []
-    links    = get_sitemap_article_links()
-
-    for link in links:
+async def scrape_article(session, semaphore, limiter, pool, link):
+    async with semaphore:
+        html = None
         try:
-            art = parse_article(link)
-            if art:
-                articles.append(art)
-                print(f" • Scraped Article {art['article_number']}: {art['title']}")
+            await limiter.wait()  # polite request rate towards gdpr-info.eu
+            html = await fetch_article(session, link)
         except Exception as e:
             print(f"[!] Error scraping {link}: {e}")
-        time.sleep(0.5)  # polite pause between requests
+    if html is None:
+        return None
+
+    # Parse outside the semaphore so the slot goes straight to the next download
+    art = None
+    try:
+        art = await asyncio.get_running_loop().run_in_executor(pool, parse_article, link, html)
+        if art:
+            print(f" • Scraped Article {art['article_number']}: {art['title']}")
+    except Exception as e:
+        print(f"[!] Error scraping {link}: {e}")
+    return art
+
+def write_articles(path, articles):
+    # Serialize one article at a time so the encoder never buffers the whole corpus at once.
+    # Nested lines get two extra spaces, so the file matches dumping the list with OPT_INDENT_2.
+    with open(path, "wb") as f:
+        if not articles:
+            f.write(b"[]")
+            return
+        f.write(b"[\n")
+        for i, art in enumerate(articles):
+            if i:
+                f.write(b",\n")
+            f.write(b"  " + orjson.dumps(art, option=orjson.OPT_INDENT_2).replace(b"\n", b"\n  "))
+        f.write(b"\n]")
+
+async def main():
+    # A few concurrent requests over pooled connections instead of one page at a time
+    connector = aiohttp.TCPConnector(limit=16, ttl_dns_cache=300)
+    with ProcessPoolExecutor() as pool:
+        async with aiohttp.ClientSession(connector=connector) as session:
+            links     = await get_sitemap_article_links(session)
+            semaphore = asyncio.Semaphore(CONCURRENCY)
+            limiter   = RateLimiter(RATE_LIMIT)
+            results   = await asyncio.gather(*(
+                scrape_article(session, semaphore, limiter, pool, link) for link in links
+            ))
+
+    articles = [art for art in results if art]
 
     # Sort ascending by numeric article_number
     articles.sort(key=lambda a: int(a["article_number"]))
 
     # Write to JSON
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(articles, f, indent=2, ensure_ascii=False)
+    write_articles(OUTPUT_FILE, articles)
 
     print(f"[✓] Saved {len(articles)} GDPR articles to {OUTPUT_FILE}")
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
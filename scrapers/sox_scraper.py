@@ -1,144 +1,166 @@
+import io
 import os
 import re
-import json
-import time
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from email.utils import formatdate
 import fitz  
 
 PDF_URL     = "https://www.govinfo.gov/content/pkg/PLAW-107publ204/pdf/PLAW-107publ204.pdf"
 PDF_PATH    = "sox.pdf"
 OUTPUT_FILE = "sox_sections.json"
 
+# Keep-alive session with retries on transient server errors
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=4,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+))
+
+WHITESPACE_RE = re.compile(r'\s+')
+
+# Running headers/footers ("Page X" or repeated title lines) sit within this many points of the page edge
+MARGIN = 50
+HEADER_RE = re.compile(r'^\s*page |sarbanes-oxley act', re.IGNORECASE | re.MULTILINE)
+
+# Join words hyphenated across line breaks and expand ligatures (ﬁ, ﬂ) into plain letters
+TEXT_FLAGS = (fitz.TEXTFLAGS_BLOCKS | fitz.TEXT_DEHYPHENATE) & ~fitz.TEXT_PRESERVE_LIGATURES
+
+# Whole lines to drop: print-production artifacts (slug lines, file paths, revision stamps) and
+# bare "Sec. X" page headers. [^\S\n] is whitespace within a line.
+ARTIFACT_LINE_RE = re.compile(
+    r'^[^\S\n]*(?:VerDate|Jkt|PO 00000|Frm|Fmt|Sfmt|HOLC|February|As Amended Through|.*G:\\COMP\\SEC\\).*$'
+    r'|^[^\S\n]*Sec\.\S*(?:[^\S\n]+\S+)?[^\S\n]*$',
+    re.MULTILINE
+)
+
+# Define the specific sections we want to extract based on the table of contents
+TARGET_SECTIONS = frozenset({
+    # Title I - Public Company Accounting Oversight Board
+    '101', '102', '103', '104', '105', '106', '107', '108', '109',
+    # Title II - Auditor Independence  
+    '201', '202', '203', '204', '205', '206', '207', '208', '209',
+    # Title III - Corporate Responsibility
+    '301', '302', '303', '304', '305', '306', '307', '308',
+    # Title IV - Enhanced Financial Disclosures
+    '401', '402', '403', '404', '405', '406', '407', '408', '409',
+    # Title V - Analyst Conflicts of Interest
+    '501',
+    # Title VI - Commission Resources and Authority
+    '601', '602', '603', '604',
+    # Title VII - Studies and Reports
+    '701', '702', '703', '704', '705',
+    # Title VIII - Corporate and Criminal Fraud Accountability
+    '801', '802', '803', '804', '805', '806', '807',
+    # Title IX - White-Collar Crime Penalty Enhancements
+    '901', '902', '903', '904', '905', '906',
+    # Title X - Corporate Tax Returns
+    '1001',
+    # Title XI - Corporate Fraud and Accountability
+    '1101', '1102', '1103', '1104', '1105', '1106', '1107'
+})
+
+def title_number_for(section_number):
+    # Title number from section number: 1001 is Title X, 1101-1107 Title XI, otherwise the first digit
+    if section_number.startswith('100'):
+        return "10"
+    if section_number.startswith('110'):
+        return "11"
+    return section_number[0]
+
+SECTION_TITLE_NUMBERS = {section: title_number_for(section) for section in TARGET_SECTIONS}
+
+# Section headings in "SEC. 101. Title" format
+SECTION_HEADING_RE = re.compile(r'SEC\.\s+(\d+)\.\s+([^\n]+)', re.MULTILINE)
+
 def download_pdf():
-    # Download the SOX PDF from govinfo if not already present.
-    if not os.path.exists(PDF_PATH):
-        print(f"[+] Downloading SOX from {PDF_URL} …")
-        resp = requests.get(PDF_URL)
-        resp.raise_for_status()
-        with open(PDF_PATH, "wb") as f:
-            f.write(resp.content)
-        time.sleep(0.5)
-        print("[✓] Download complete")
-    else:
-        print("[i] PDF already present, skipping download")
+    # Download the SOX PDF from govinfo, streaming it to disk; an existing copy is only
+    # replaced when the server reports a newer one.
+    headers = {}
+    if os.path.exists(PDF_PATH):
+        headers["If-Modified-Since"] = formatdate(os.path.getmtime(PDF_PATH), usegmt=True)
+    
+    try:
+        with SESSION.get(PDF_URL, headers=headers, stream=True, timeout=30) as resp:
+            if resp.status_code == 304:
+                print("[i] PDF already present and unchanged, skipping download")
+                return PDF_PATH
+            resp.raise_for_status()
+            
+            print(f"[+] Downloading SOX from {PDF_URL} …")
+            # Write to a temporary file so an interrupted download never looks like a complete PDF
+            part_path = PDF_PATH + ".part"
+            with open(part_path, "wb") as f:
+                for chunk in resp.iter_content(chunk_size=65536):
+                    f.write(chunk)
+            os.replace(part_path, PDF_PATH)
+    except requests.RequestException as e:
+        if not headers:
+            raise
+        print(f"[!] Could not check for an updated PDF ({e}), using the local copy")
+        return PDF_PATH
+    
+    print("[✓] Download complete")
     return PDF_PATH
 
 def extract_full_text(pdf_path):
-    doc = fitz.open(pdf_path)
-    all_lines = []
-    for page in doc:
-        text = page.get_text()
-        # remove page headers/footers like "Page X" or repeated title lines
-        cleaned = []
-        for line in text.splitlines():
-            low = line.strip().lower()
-            if low.startswith("page ") or "sarbanes-oxley act" in low:
-                continue
-            cleaned.append(line)
-        all_lines.extend(cleaned)
-    return "\n".join(all_lines)
+    buf = io.StringIO()
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            top, bottom = page.rect.y0 + MARGIN, page.rect.y1 - MARGIN
+            # (x0, y0, x1, y1, text, block_no, block_type); block_type 1 is an image
+            for x0, y0, x1, y1, text, _, block_type in page.get_text("blocks", flags=TEXT_FLAGS):
+                if block_type != 0:
+                    continue
+                # remove page headers/footers like "Page X" or repeated title lines
+                if (y0 < top or y1 > bottom) and HEADER_RE.search(text):
+                    continue
+                buf.write(text.rstrip("\n"))
+                buf.write("\n")
+    return buf.getvalue()
 
 def clean_content(content):
     # Clean the extracted content by removing formatting artifacts and normalizing whitespace.
-    lines = content.split('\n')
-    cleaned_lines = []
-    
-    for line in lines:
-        line = line.strip()
-        # Skip empty lines, page numbers, and common headers/footers
-        if not line or line.startswith('VerDate') or line.startswith('Jkt') or \
-           line.startswith('PO 00000') or line.startswith('Frm') or \
-           line.startswith('Fmt') or line.startswith('Sfmt') or \
-           'G:\\COMP\\SEC\\' in line or line.startswith('HOLC') or \
-           line.startswith('February') or line.startswith('As Amended Through') or \
-           line.startswith('Sec.') and len(line.split()) <= 2:
-            continue
-        cleaned_lines.append(line)
-    
-    # Join lines with spaces and normalize whitespace
-    cleaned_text = ' '.join(cleaned_lines)
-    
-    # Remove multiple spaces and normalize
-    import re
-    cleaned_text = re.sub(r'\s+', ' ', cleaned_text)
-    cleaned_text = cleaned_text.strip()
-    
-    return cleaned_text
+    # Dropped lines become a space, so empty lines and line breaks fall to the whitespace collapse.
+    cleaned_text = ARTIFACT_LINE_RE.sub(' ', content)
+    return WHITESPACE_RE.sub(' ', cleaned_text).strip()
 
 def split_into_sections(full_text):
-    # Define the specific sections we want to extract based on the table of contents
-    target_sections = {
-        # Title I - Public Company Accounting Oversight Board
-        '101', '102', '103', '104', '105', '106', '107', '108', '109',
-        # Title II - Auditor Independence  
-        '201', '202', '203', '204', '205', '206', '207', '208', '209',
-        # Title III - Corporate Responsibility
-        '301', '302', '303', '304', '305', '306', '307', '308',
-        # Title IV - Enhanced Financial Disclosures
-        '401', '402', '403', '404', '405', '406', '407', '408', '409',
-        # Title V - Analyst Conflicts of Interest
-        '501',
-        # Title VI - Commission Resources and Authority
-        '601', '602', '603', '604',
-        # Title VII - Studies and Reports
-        '701', '702', '703', '704', '705',
-        # Title VIII - Corporate and Criminal Fraud Accountability
-        '801', '802', '803', '804', '805', '806', '807',
-        # Title IX - White-Collar Crime Penalty Enhancements
-        '901', '902', '903', '904', '905', '906',
-        # Title X - Corporate Tax Returns
-        '1001',
-        # Title XI - Corporate Fraud and Accountability
-        '1101', '1102', '1103', '1104', '1105', '1106', '1107'
-    }
+    # Walk the "SEC. 101." headings once; each section runs from the end of its heading to the next one
+    matches = list(SECTION_HEADING_RE.finditer(full_text))
     
-    # Regex to capture each section heading - looking for "SEC. 101." format
-    pattern = re.compile(r'(SEC\.\s+(\d+)\.\s+[^\n]+)', re.MULTILINE)
-    parts = pattern.split(full_text)
-    
-    # parts = [preamble, heading1, num1, content1, heading2, num2, content2, ...]
     sections = []
-    for i in range(1, len(parts), 3):
-        if i+2 < len(parts):  # Make sure we have all parts
-            heading = parts[i].strip()
-            section_number = parts[i+1].strip()
-            content = parts[i+2].strip()
-            
-            # Only process sections that are in our target list
-            if section_number not in target_sections:
-                continue
-            
-            # Clean the content
-            content = clean_content(content)
-            
-            # Extract title from heading (remove "SEC. XXX." part)
-            title_match = re.match(r'SEC\.\s+\d+\.\s*(.*)', heading)
-            title = title_match.group(1) if title_match else heading
-            
-            # Clean the title as well
-            title = clean_content(title)
-            
-            # Determine title number from section number
-            if section_number.startswith('10'):  # 1001, 1101, etc.
-                if section_number.startswith('100'):
-                    title_number = "10"  # Title X
-                elif section_number.startswith('110'):
-                    title_number = "11"  # Title XI
-                else:
-                    title_number = section_number[0]  # Fallback
-            else:
-                title_number = section_number[0]  # First digit for titles 1-9
-            
-            # Include section number in the title
-            full_title = f"Section {section_number}: {title}"
-            
-            sections.append({
-                "standard": "sox",
-                "article_number": title_number,
-                "title": full_title,
-                "url": PDF_URL,
-                "content": content
-            })
+    for match, next_match in zip(matches, matches[1:] + [None]):
+        section_number = match.group(1)
+        
+        # Only process sections that are in our target list
+        if section_number not in TARGET_SECTIONS:
+            continue
+        
+        end = next_match.start() if next_match else len(full_text)
+        
+        # Clean the content
+        content = clean_content(full_text[match.end():end])
+        
+        # Title is the rest of the heading line, cleaned as well
+        title = clean_content(match.group(2))
+        
+        # Determine title number from section number
+        title_number = SECTION_TITLE_NUMBERS[section_number]
+        
+        # Include section number in the title
+        full_title = f"Section {section_number}: {title}"
+        
+        sections.append({
+            "standard": "sox",
+            "article_number": title_number,
+            "title": full_title,
+            "url": PDF_URL,
+            "content": content
+        })
     return sections
 
 def main():
@@ -152,8 +174,8 @@ def main():
     sections.sort(key=lambda s: int(s["article_number"]))
 
     # Write out JSON
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(sections, f, indent=2, ensure_ascii=False)
+    with open(OUTPUT_FILE, "wb") as f:
+        f.write(orjson.dumps(sections, option=orjson.OPT_INDENT_2))
 
     print(f"[✓] Extracted {len(sections)} SOX sections to {OUTPUT_FILE}")
 
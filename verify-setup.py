@@ -8,6 +8,10 @@ import os
 import sys
 import subprocess
 import platform
+from importlib.util import find_spec
+
+# Packages the backend cannot start without
+REQUIRED_PACKAGES = ("fastapi", "uvicorn", "pinecone", "sentence_transformers")
 
 def check_python_version():
     """Check if Python version is 3.11 or higher"""
@@ -89,12 +93,13 @@ def check_frontend_deps():
 
 def check_python_deps():
     """Check if Python dependencies are installed"""
-    try:
-        import fastapi, uvicorn, pinecone, sentence_transformers
+    # Only locate the packages; importing sentence_transformers would load torch and transformers
+    missing = [name for name in REQUIRED_PACKAGES if find_spec(name) is None]
+    if not missing:
         print("✅ Python dependencies installed")
         return True
-    except ImportError as e:
-        print(f"❌ Python dependencies missing - Run 'pip install -r requirements.txt'")
+    else:
+        print(f"❌ Python dependencies missing ({', '.join(missing)}) - Run 'pip install -r requirements.txt'")
         return False
 
 def main():